@@ -1,7 +1,39 @@
-import streamlit as st
+import datetime
+import hashlib
+import hmac
+import html
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go # Used for consistency, though px handles pie charts well
+import streamlit as st
+import plotly.io as pio
+import pyarrow.feather as feather
+
+from backends import available_backends, get_backend
+from filter_index import FilterIndex
+from perf import StageRecorder, activate_recorder, stage
+from rollup_cube import RollupCube
+
+from pipeline import (
+    CLEANING_PIPELINE_VERSION, DEFAULT_CHUNK_ROWS, DEFAULT_SKETCH_CAPACITY, SKETCH_COLUMNS, TREND_FREQUENCIES,
+    build_location_figure, build_media_type_figure, build_platform_figure, build_sentiment_figure,
+    build_trend_figure, compute_dashboard_aggregates, drop_covered_hours, figure_fingerprint, frame_memory_bytes,
+    get_engagement_trend_insights, get_location_insights, get_media_type_insights, get_platform_anomaly_insights,
+    get_platform_insights, get_sentiment_insights, group_media_data, grouping_frequency, merge_groups,
+    prepare_trend_series, read_media_csv, read_media_csv_parallel, resolve_trend_frequency, stream_grouped_media_data, summarize_groups,
+    summarize_merged_groups,
+)
+
+# Cleaned frames are shared by every session that opens the same data; with copy-on-write a session's
+# changes to its view of a frame never reach the shared copy
+pd.set_option('mode.copy_on_write', True)
 
 # --- Streamlit Page Configuration ---
 # Sets the page layout to wide and provides a title for the browser tab
@@ -145,7 +177,7 @@ st.markdown("""
             <span class="font-semibold" style="color: #d8b4fe;">Prepare your CSV file:</span> Ensure it has the following columns: <code style="background-color: #374151; border-radius: 0.25rem; padding: 0.25rem 0.5rem; font-size: 0.875rem;">Date</code>, <code style="background-color: #374151; border-radius: 0.25rem; padding: 0.25rem 0.5rem; font-size: 0.875rem;">Platform</code>, <code style="background-color: #374151; border-radius: 0.25rem; padding: 0.25rem 0.5rem; font-size: 0.875rem;">Sentiment</code>, <code style="background-color: #374151; border-radius: 0.25rem; padding: 0.25rem 0.5rem; font-size: 0.875rem;">Location</code>, <code style="background-color: #374151; border-radius: 0.25rem; padding: 0.25rem 0.5rem; font-size: 0.875rem;">Engagements</code>, <code style="background-color: #374151; border-radius: 0.25rem; padding: 0.25rem 0.5rem; font-size: 0.875rem;">Media Type</code>.
         </li>
         <li class="list-item">
-            <span class="font-semibold" style="color: #d8b4fe;">Upload your CSV:</span> Use the file uploader below to select your prepared CSV.
+            <span class="font-semibold" style="color: #d8b4fe;">Upload your CSV:</span> Use the file uploader below to select your prepared CSV. Several files (for example daily exports) can be uploaded together and are combined into one dataset.
         </li>
         <li class="list-item">
             <span class="font-semibold" style="color: #d8b4fe;">View the insights:</span> Once uploaded, the dashboard will automatically clean your data and display interactive charts along with key insights for each visualization.
@@ -154,17 +186,490 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# --- Data Loading & Caching ---
+# Memory ceiling for cleaned DataFrames and derived objects shared across sessions (override with DASHBOARD_CACHE_MB)
+DEFAULT_CACHE_BUDGET_MB = 1024
+# On-disk columnar cache of cleaned datasets (override with DASHBOARD_DISK_CACHE_DIR / DASHBOARD_DISK_CACHE_MB)
+DEFAULT_DISK_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'media-dashboard')
+DEFAULT_DISK_CACHE_BUDGET_MB = 10240
+# Digest size of upload content hashes; dataset keys are the pipeline version plus this many bytes in hex
+CONTENT_HASH_BYTES = 16
+
+def hash_uploaded_bytes(uploaded_file):
+    # Hash the raw upload without copying it; BLAKE2b keeps multi-GB files cheap to fingerprint
+    digest = hashlib.blake2b(digest_size=CONTENT_HASH_BYTES)
+    with uploaded_file.getbuffer() as view:
+        digest.update(view)
+    return digest.hexdigest()
+
+def dataset_key(content_hash):
+    # Cache key for a cleaned dataset; embedding the pipeline version invalidates entries when cleaning rules change
+    return f"v{CLEANING_PIPELINE_VERSION}-{content_hash}"
+
+def dataset_of(entry_key):
+    # Dataset key an in-memory entry belongs to; derived entries extend the dataset key with a suffix
+    return entry_key[:len(dataset_key('')) + 2 * CONTENT_HASH_BYTES]
+
+class SharedDatasetStore:
+    # Process-wide store of cleaned DataFrames and the objects derived from them (aggregates, filter index,
+    # grouped frames, figures), shared by every session that opens the same content. Entry keys start with the
+    # dataset key, so a dataset's derived entries are found by prefix. Sessions hold datasets through leases;
+    # a held dataset is never evicted, and the least recently used unheld entries go once the store would
+    # exceed its memory ceiling.
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # key -> (value, size in bytes, label), oldest first
+        self._holders = {} # lease id -> dataset keys that session currently shows
+        self._lock = threading.Lock() # Streamlit runs each session in its own thread
+
+    @staticmethod
+    def view(value):
+        # Sessions get their own shallow DataFrame over the shared data; with copy-on-write enabled any
+        # change a session makes copies the affected columns instead of writing into the shared frame.
+        # Other values (aggregates, indexes, figures) are treated as immutable by the dashboard.
+        return value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key) # Mark as most recently used
+            self.hits += 1
+        return self.view(entry[0])
+
+    def _held(self, key):
+        return any(dataset_of(key) in held for held in self._holders.values())
+
+    def put(self, key, value, nbytes=None, label=None):
+        # nbytes is required for values that are not DataFrames; label names the dataset in the admin view
+        if nbytes is None:
+            nbytes = frame_memory_bytes(value)
+        with self._lock:
+            if key in self._entries:
+                self.resident_bytes -= self._entries.pop(key)[1]
+            # Free space from the least recently used entries no session holds; if that is not enough the
+            # value is served uncached rather than pushing the store past its ceiling
+            evictable = [entry_key for entry_key in self._entries if not self._held(entry_key)]
+            if self.resident_bytes - sum(self._entries[entry_key][1] for entry_key in evictable) + nbytes > self.budget_bytes:
+                return
+            for entry_key in evictable:
+                if self.resident_bytes + nbytes <= self.budget_bytes:
+                    break
+                self.resident_bytes -= self._entries.pop(entry_key)[1]
+                self.evictions += 1
+            self._entries[key] = (value, nbytes, label)
+            self.resident_bytes += nbytes
+
+    def retain(self, lease_id, dataset_keys):
+        # Replace the set of datasets a session holds; the datasets it no longer shows become evictable
+        with self._lock:
+            self._holders[lease_id] = frozenset(dataset_keys)
+
+    def release(self, lease_id):
+        with self._lock:
+            self._holders.pop(lease_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'sessions': len(self._holders),
+                'resident_mb': self.resident_bytes / (1024 * 1024),
+                'budget_mb': self.budget_bytes / (1024 * 1024),
+            }
+
+    def resident_datasets(self):
+        # One row per dataset with entries in memory, most recently used first: its size (including derived
+        # entries) and how many sessions hold it. Figures are shared by fingerprint, so they get one row of their own.
+        with self._lock:
+            datasets = {}
+            for key, (_, nbytes, label) in reversed(self._entries.items()):
+                if key.startswith('figure-'):
+                    dataset, label = 'figures', 'Chart figures'
+                else:
+                    dataset = dataset_of(key)
+                row = datasets.setdefault(dataset, {'dataset': dataset, 'name': None, 'entries': 0, 'bytes': 0})
+                row['name'] = row['name'] or label
+                row['entries'] += 1
+                row['bytes'] += nbytes
+            for row in datasets.values():
+                row['sessions'] = sum(row['dataset'] in held for held in self._holders.values())
+            return list(datasets.values())
+
+class DatasetLease:
+    # A session's claim on the datasets it shows. It lives in st.session_state, so when Streamlit discards a
+    # closed session the lease is garbage collected and its datasets are released.
+    def __init__(self, store):
+        self.lease_id = uuid.uuid4().hex
+        self._store = store
+        weakref.finalize(self, store.release, self.lease_id)
+
+    def hold(self, dataset_keys):
+        self._store.retain(self.lease_id, dataset_keys)
+
+@st.cache_resource
+def get_dataset_store():
+    # st.cache_resource makes this a single instance shared by every rerun and session
+    budget_mb = float(os.environ.get('DASHBOARD_CACHE_MB', DEFAULT_CACHE_BUDGET_MB))
+    return SharedDatasetStore(int(budget_mb * 1024 * 1024))
+
+class DiskDatasetCache:
+    # Cleaned frames persisted as uncompressed Feather (Arrow IPC) files, which are memory-mapped on load.
+    # Each dataset is <key>.feather plus a <key>.json sidecar with its display metadata. File mtimes track
+    # last use: the least recently used datasets are deleted once the directory exceeds its budget.
+    def __init__(self, directory, budget_bytes):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._remove_stale_versions()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.feather', base + '.json'
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _remove_stale_versions(self):
+        # Datasets cleaned by a different pipeline version can never be hit again
+        current_prefix = dataset_key('')
+        for name in os.listdir(self.directory):
+            key, extension = os.path.splitext(name)
+            if extension in ('.feather', '.json') and not key.startswith(current_prefix):
+                self._remove(key)
+
+    def get(self, key):
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as meta_file:
+                metadata = json.load(meta_file)
+            df = feather.read_table(data_path, memory_map=True).to_pandas()
+            os.utime(data_path) # Record the access for LRU eviction
+        except (OSError, ValueError): # Missing, partially evicted or unreadable entry
+            return None
+        df.attrs['memory_report'] = metadata.get('memory_report')
+        return df
+
+    def name(self, key):
+        # Display name recorded when the dataset was first cleaned, or None
+        try:
+            with open(self._paths(key)[1]) as meta_file:
+                return json.load(meta_file).get('name')
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, df, name):
+        data_path, meta_path = self._paths(key)
+        metadata = {'name': name, 'rows': len(df), 'memory_report': df.attrs.get('memory_report')}
+        with self._lock:
+            # Write to temporary files and rename, so concurrent sessions never read a half-written dataset
+            feather.write_feather(df, data_path + '.tmp', compression='uncompressed')
+            with open(meta_path + '.tmp', 'w') as meta_file:
+                json.dump(metadata, meta_file)
+            os.replace(meta_path + '.tmp', meta_path)
+            os.replace(data_path + '.tmp', data_path)
+            self._evict()
+
+    def _evict(self):
+        entries = self.recent()
+        total_bytes = sum(entry['bytes'] for entry in entries)
+        for entry in reversed(entries): # Least recently used first
+            if total_bytes <= self.budget_bytes:
+                break
+            self._remove(entry['key'])
+            total_bytes -= entry['bytes']
+
+    def recent(self):
+        # Metadata of every cached dataset, most recently used first
+        entries = []
+        for name in os.listdir(self.directory):
+            key, extension = os.path.splitext(name)
+            if extension != '.feather':
+                continue
+            data_path, meta_path = self._paths(key)
+            try:
+                modified = os.stat(data_path)
+                with open(meta_path) as meta_file:
+                    metadata = json.load(meta_file)
+            except (OSError, ValueError):
+                continue
+            metadata.update(key=key, bytes=modified.st_size, last_used=modified.st_mtime)
+            entries.append(metadata)
+        return sorted(entries, key=lambda entry: entry['last_used'], reverse=True)
+
+@st.cache_resource
+def get_disk_dataset_cache():
+    directory = os.environ.get('DASHBOARD_DISK_CACHE_DIR', DEFAULT_DISK_CACHE_DIR)
+    budget_mb = float(os.environ.get('DASHBOARD_DISK_CACHE_MB', DEFAULT_DISK_CACHE_BUDGET_MB))
+    return DiskDatasetCache(directory, int(budget_mb * 1024 * 1024))
+
+def get_cached_dataset(key):
+    # Look a cleaned dataset up in memory first, then on disk; disk hits are promoted into memory.
+    # Returns (DataFrame, source) with source 'memory' or 'disk', or (None, None) when it is not cached.
+    cache = get_dataset_store()
+    df = cache.get(key)
+    if df is not None:
+        return df, 'memory'
+    df = get_disk_dataset_cache().get(key)
+    if df is not None:
+        cache.put(key, df, label=get_disk_dataset_cache().name(key))
+        return cache.view(df), 'disk'
+    return None, None
+
+@st.cache_resource
+def get_parse_pool(workers):
+    # Long-lived worker processes for parallel CSV parsing, one pool per worker count. Spawned rather than
+    # forked, since forking the multi-threaded server process is unsafe.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+@st.cache_resource
+def get_aggregation_backend(name):
+    # Backends are stateless apart from their settings, so one instance serves every session. DuckDB spills
+    # next to the disk cache once it reaches DASHBOARD_DUCKDB_MEMORY_LIMIT (e.g. '4GB'; default: 80% of RAM).
+    if name == 'duckdb':
+        spill_directory = os.path.join(os.environ.get('DASHBOARD_DISK_CACHE_DIR', DEFAULT_DISK_CACHE_DIR), 'duckdb-spill')
+        return get_backend(name, memory_limit=os.environ.get('DASHBOARD_DUCKDB_MEMORY_LIMIT'), temp_directory=spill_directory)
+    return get_backend(name)
+
+def load_cleaned_frame(uploaded_file, parse_workers=1, backend=None):
+    # Returns (dataset key, DataFrame, source) with source 'memory', 'disk' or 'csv'; cached sources skip CSV
+    # parsing entirely. `backend` replaces the built-in pandas parsing (None keeps it); every backend produces
+    # the same cleaned frame, so cached entries are shared between them.
+    key = dataset_key(hash_uploaded_bytes(uploaded_file))
+    df, source = get_cached_dataset(key)
+    if df is not None:
+        return key, df, source
+    uploaded_file.seek(0)
+    # The before/after memory report lives in df.attrs, so it survives cache hits
+    if backend is not None:
+        df = backend.clean(uploaded_file)
+    elif parse_workers > 1:
+        df = read_media_csv_parallel(uploaded_file, get_parse_pool(parse_workers), parse_workers)
+    else:
+        df = read_media_csv(uploaded_file)
+    get_dataset_store().put(key, df, label=uploaded_file.name)
+    get_disk_dataset_cache().put(key, df, uploaded_file.name)
+    return key, get_dataset_store().view(df), 'csv'
+
+def sketch_key_suffix(sketch_columns, sketch_capacity):
+    # Cache-key suffix separating sketched results from exact ones (and different sketch settings)
+    return f"-sketch-{'+'.join(sketch_columns)}-{sketch_capacity}" if sketch_columns else ''
+
+def get_dataset_aggregates(key, df, sketch_columns=(), sketch_capacity=DEFAULT_SKETCH_CAPACITY, backend=None):
+    # Unfiltered chart aggregates are computed once per dataset, not on every rerun
+    cache = get_dataset_store()
+    cache_key = key + '-aggregates' + sketch_key_suffix(sketch_columns, sketch_capacity)
+    aggregates = cache.get(cache_key)
+    if aggregates is None:
+        if backend is not None and not sketch_columns:
+            aggregates = backend.aggregates(df)
+        else:
+            aggregates = compute_dashboard_aggregates(df, sketch_columns, sketch_capacity)
+        cache.put(cache_key, aggregates, aggregates.nbytes)
+    return aggregates
+
+def get_filter_index(key, df):
+    # Sorted date index and per-category row positions, built once per dataset
+    cache = get_dataset_store()
+    index = cache.get(key + '-index')
+    if index is None:
+        index = FilterIndex(df)
+        cache.put(key + '-index', index, index.nbytes)
+    return index
+
+def get_rollup_cube(key, load_groups):
+    # Rollup cube of a dataset for drill-down mode, built once from its grouped frame (load_groups returns it)
+    cache = get_dataset_store()
+    cube = cache.get(key + '-cube')
+    if cube is None:
+        cube = RollupCube(load_groups())
+        cache.put(key + '-cube', cube, cube.nbytes)
+    return cube
+
+def get_cached_figure(chart, data, build, *args):
+    # Figures are shared by every session and rerun plotting the same data; `data` is the Series the chart
+    # plots, build(*args) makes the figure on a miss. Figures are only read after this, never modified.
+    cache = get_dataset_store()
+    key = 'figure-' + figure_fingerprint(chart, data)
+    fig = cache.get(key)
+    if fig is None:
+        fig = build(*args)
+        cache.put(key, fig, len(pio.to_json(fig, validate=False)))
+    return fig
+
+def get_dataset_groups(key, df, sketch_columns=(), sketch_capacity=DEFAULT_SKETCH_CAPACITY, backend=None):
+    # Grouped partial aggregates of a cleaned dataset (what several uploaded files are merged from)
+    cache = get_dataset_store()
+    cache_key = key + '-grouped' + sketch_key_suffix(sketch_columns, sketch_capacity)
+    groups = cache.get(cache_key)
+    if groups is None:
+        if backend is not None and not sketch_columns:
+            groups = backend.group(df)
+        else:
+            groups = group_media_data(df, grouping_frequency(df['date']), sketch_columns, sketch_capacity)
+        cache.put(cache_key, groups)
+        groups = cache.view(groups)
+    return groups
+
+def load_streamed_groups(uploaded_file, chunk_rows, on_progress=None, sketch_columns=(), sketch_capacity=DEFAULT_SKETCH_CAPACITY, backend=None):
+    # Streaming counterpart of load_cleaned_frame: caches the grouped frame instead of the full data.
+    # Returns (dataset key, groups, source); groups is None (or empty) for a file without any rows.
+    # A `backend` groups the whole file itself, out of core, instead of the chunked pandas reader.
+    cache = get_dataset_store()
+    key = dataset_key(hash_uploaded_bytes(uploaded_file))
+    cache_key = key + '-groups' + sketch_key_suffix(sketch_columns, sketch_capacity)
+    groups = cache.get(cache_key)
+    if groups is not None:
+        return key, groups, 'memory'
+    uploaded_file.seek(0)
+    if backend is not None and not sketch_columns:
+        groups = backend.group(uploaded_file)
+    else:
+        groups = stream_grouped_media_data(uploaded_file, chunk_rows, on_progress, sketch_columns, sketch_capacity)
+    if groups is not None:
+        cache.put(cache_key, groups, label=uploaded_file.name)
+    return key, cache.view(groups), 'csv'
+
+def streaming_progress_reporter(uploaded_file, progress_bar):
+    # Progress callback for stream_grouped_media_data: fraction of the uploaded bytes consumed so far
+    def report_progress(rows_read, elapsed):
+        fraction = min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0)
+        progress_bar.progress(fraction, text=f"Streaming {uploaded_file.name}... {rows_read:,} rows read ({rows_read / max(elapsed, 1e-9):,.0f} rows/s)")
+    return report_progress
+
+def merge_session_groups(parts, skip_loaded_days):
+    # Folds per-file grouped aggregates, given as (dataset key, file name, groups) in upload order, into the
+    # session's merged dataset. Files already merged are not touched again: appending a file to the upload
+    # list only merges that file's groups. Removing or reordering files, or toggling skip_loaded_days,
+    # rebuilds the merge from the (cached) per-file groups.
+    keys = [key for key, _, _ in parts]
+    merged = st.session_state.get('merged_upload')
+    if merged is None or merged['skip_loaded_days'] != skip_loaded_days or keys[:len(merged['keys'])] != merged['keys']:
+        merged = {'keys': [], 'skip_loaded_days': skip_loaded_days, 'groups': None, 'covered_hours': None, 'files': [], 'aggregates': None, 'cube': None}
+    for key, name, groups in parts[len(merged['keys']):]:
+        file_rows = int(groups['rows'].sum()) if groups is not None else 0
+        if groups is not None and skip_loaded_days:
+            groups, merged['covered_hours'] = drop_covered_hours(groups, merged['covered_hours'])
+        kept_rows = int(groups['rows'].sum()) if groups is not None else 0
+        if kept_rows:
+            merged['groups'] = groups if merged['groups'] is None else merge_groups([merged['groups'], groups])
+            merged['aggregates'] = None
+            merged['cube'] = None
+        merged['keys'].append(key)
+        merged['files'].append({'name': name, 'rows': file_rows, 'skipped_rows': file_rows - kept_rows})
+    if merged['aggregates'] is None and merged['groups'] is not None:
+        merged['aggregates'] = summarize_merged_groups(merged['groups'])
+    st.session_state['merged_upload'] = merged
+    return merged
+
+# --- Processing Options (Sidebar) ---
+st.sidebar.markdown('<h2 class="section-header" style="color: #d8b4fe;">Processing Options</h2>', unsafe_allow_html=True)
+streaming_mode = st.sidebar.checkbox(
+    "Streaming mode (bounded memory)",
+    value=False,
+    help="Reads the CSV in chunks and keeps only running aggregates instead of the full cleaned table. Use this for exports too large to load at once."
+)
+chunk_rows = st.sidebar.number_input("Rows per chunk", min_value=10_000, value=DEFAULT_CHUNK_ROWS, step=50_000, disabled=not streaming_mode)
+parse_workers = st.sidebar.number_input(
+    "Parse workers",
+    min_value=1,
+    max_value=max(os.cpu_count() or 1, 1),
+    value=min(int(os.environ.get('DASHBOARD_PARSE_WORKERS', os.cpu_count() or 1)), os.cpu_count() or 1),
+    disabled=streaming_mode,
+    help="Processes used to parse and clean large CSV files in parallel. Files under 32 MB are always parsed by one process."
+)
+
+# Opt-in per-stage timing; on by default when ops collect the stats in a shared log (DASHBOARD_PERF_LOG)
+perf_enabled = st.sidebar.checkbox(
+    "Performance instrumentation",
+    value=bool(os.environ.get('DASHBOARD_PERF_LOG')),
+    help="Records wall time, peak memory growth and row counts for every processing stage and shows them in a Performance panel at the bottom of the page."
+)
+perf_recorder = StageRecorder(st.session_state.setdefault('perf_session_id', uuid.uuid4().hex)) if perf_enabled else None
+activate_recorder(perf_recorder)
+
+# Heavy-hitter mode: high-cardinality columns are summarized by a bounded-size sketch instead of exact sums
+heavy_hitter_mode = st.sidebar.checkbox(
+    "Approximate top values (heavy-hitter sketch)",
+    value=False,
+    help="Keeps a fixed number of counters per sketched column instead of a total for every distinct value. Much lighter for feeds with hundreds of thousands of locations; figures become approximate with a reported error bound. Untick for exact figures."
+)
+sketch_selection = st.sidebar.multiselect("Sketched columns", options=list(SKETCH_COLUMNS), default=['location'], format_func=str.title, disabled=not heavy_hitter_mode)
+sketch_capacity = int(st.sidebar.number_input("Sketch counters", min_value=10, value=DEFAULT_SKETCH_CAPACITY, step=100, disabled=not heavy_hitter_mode))
+sketch_columns = tuple(column for column in SKETCH_COLUMNS if column in sketch_selection) if heavy_hitter_mode else ()
+
+skip_loaded_days = st.sidebar.checkbox(
+    "Skip hours already loaded",
+    value=False,
+    disabled=bool(sketch_columns), # A sketch cannot take back the engagements of an overlapping hour
+    help="When several files are uploaded they are merged in upload order. With this on, rows in hours an earlier file already covers are dropped, so overlapping exports are not counted twice. Files without times of day (and long exports, which are summed per day) are matched by whole days: such a day is dropped whole when an earlier file covers any part of it. Not available with sketched columns."
+) and not sketch_columns
+
+# Backend for parsing, cleaning and the grouped aggregation pass; pandas unless another engine is installed
+BACKEND_LABELS = {'pandas': 'pandas (in memory)', 'duckdb': 'DuckDB (multithreaded, out of core)'}
+backend_options = available_backends()
+backend_name = st.sidebar.selectbox(
+    "Aggregation backend",
+    options=backend_options,
+    index=backend_options.index(os.environ.get('DASHBOARD_BACKEND', 'pandas')) if os.environ.get('DASHBOARD_BACKEND') in backend_options else 0,
+    format_func=BACKEND_LABELS.get,
+    disabled=bool(sketch_columns) or len(backend_options) == 1,
+    help="Every backend produces the same charts and insights. DuckDB (pip install duckdb) parses and groups CSV files on all cores and spills to disk when memory runs short; in streaming mode it replaces chunked reading. Sketched columns always use pandas."
+)
+# None keeps the built-in pandas paths (parallel parsing, chunked streaming, sketches)
+aggregation_backend = get_aggregation_backend(backend_name) if backend_name != 'pandas' and not sketch_columns else None
+
+# Drill-down mode answers every chart from a precomputed rollup cube; it needs every dimension kept per cell
+drill_mode = st.sidebar.checkbox(
+    "Drill-down mode (cross-filter charts)",
+    value=False,
+    disabled=bool(sketch_columns),
+    help="Click a platform or location bar, or pick values in the Drill-down panel, and every other chart shows just that selection. Works for single files, streamed files and merged uploads. Not available with sketched columns."
+) and not sketch_columns
+
+# Previously cleaned datasets kept in the on-disk cache can be reopened without uploading them again
+recent_datasets = {entry['key']: entry for entry in get_disk_dataset_cache().recent()}
+recent_key = st.sidebar.selectbox(
+    "Recent datasets",
+    options=[None] + list(recent_datasets),
+    format_func=lambda key: "Select a dataset..." if key is None else
+        f"{recent_datasets[key]['name']} ({recent_datasets[key]['rows']:,} rows)",
+    help="Used when no file is uploaded. Opens an already cleaned dataset straight from the local cache."
+)
+
 # --- File Upload Section ---
 st.markdown("---")
 # Custom container for the file uploader section
 st.markdown('<div class="plotly-container" style="background-color: #1f2937; border-color: #4b5563;">'
             '<h2 class="section-header" style="color: #d8b4fe;">1. Upload Your CSV File</h2>', unsafe_allow_html=True)
-uploaded_file = st.file_uploader("", type="csv") # Streamlit's file uploader widget
+# Several files (e.g. daily drops) can be uploaded together; files added later are merged into the others
+uploaded_files = st.file_uploader("", type="csv", accept_multiple_files=True) # Streamlit's file uploader widget
+uploaded_file = uploaded_files[0] if len(uploaded_files) == 1 else None # Single-file upload keeps the full feature set
 st.markdown('</div>', unsafe_allow_html=True)
 
 df = None # Initialize DataFrame to None
+data_key = None # Cache key of the loaded dataset (full mode only)
+merged = None # Merged upload state (several files only)
+groups = None # Grouped frame of a streamed file
+stream_key = None # Cache key of a streamed file
+held_datasets = [] # Dataset keys this session shows, held in the shared store until it shows something else
+aggregates = None # Chart aggregates, filled in by either the full or the streaming path
 
-if uploaded_file is not None:
+if uploaded_files or recent_key is not None:
     # --- Data Cleaning Process ---
     st.markdown("---")
     # Custom container for the data cleaning section
@@ -174,281 +679,336 @@ if uploaded_file is not None:
                 'The dashboard automatically performs the following data cleaning steps upon CSV upload:'
                 '</p>'
                 '<ul class="list-disc list-inside text-gray-400 mt-2 ml-4">'
-                '<li>Converts the \'Date\' column to a proper datetime format.</li>'
+                '<li>Converts the \'Date\' column to a proper datetime format, using one date format detected from the data.</li>'
                 '<li>Fills any missing values in the \'Engagements\' column with a default of 0.</li>'
+                '<li>Stores Platform, Sentiment, Location and Media Type as categories and Engagements in the most compact numeric type.</li>'
                 '<li>Normalizes column names (e.g., `Date` becomes `date`, `Media Type` becomes `mediatype`) for consistent processing.</li>'
                 '<li>Rows with invalid or unparseable dates will be filtered out.</li>'
                 '</ul>', unsafe_allow_html=True)
     try:
-        # Read the CSV file into a Pandas DataFrame
-        df = pd.read_csv(uploaded_file)
-
-        # Normalize column names: strip whitespace, convert to lowercase, replace spaces with empty string
-        df.columns = df.columns.str.strip().str.lower().str.replace(' ', '')
-
-        # Convert 'Date' column to datetime objects
-        # errors='coerce' will convert parsing errors into NaT (Not a Time)
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        # Drop rows where 'date' is NaT (i.e., invalid dates)
-        df.dropna(subset=['date'], inplace=True)
-
-        # Fill missing 'Engagements' with 0 and ensure float type
-        df['engagements'] = df['engagements'].fillna(0).astype(float)
+        # The whole load is one stage; CSV parsing and cleaning steps are recorded as stages nested inside it
+        with stage('load') as load_fields:
+            if len(uploaded_files) > 1:
+                # Each file is reduced to grouped partial aggregates, cached by content so only new files are parsed
+                parts = []
+                progress_bar = st.progress(0.0, text="Loading files...")
+                for position, file in enumerate(uploaded_files):
+                    if streaming_mode:
+                        file_key, file_groups, _ = load_streamed_groups(file, int(chunk_rows), streaming_progress_reporter(file, progress_bar),
+                                                                        sketch_columns, sketch_capacity, aggregation_backend)
+                    else:
+                        file_key, file_df, _ = load_cleaned_frame(file, int(parse_workers), aggregation_backend)
+                        file_groups = get_dataset_groups(file_key, file_df, sketch_columns, sketch_capacity, aggregation_backend) if not file_df.empty else None
+                    held_datasets.append(file_key)
+                    # Sketch settings are part of the key, so changing them rebuilds the merge
+                    parts.append((file_key + sketch_key_suffix(sketch_columns, sketch_capacity), file.name, file_groups))
+                    progress_bar.progress((position + 1) / len(uploaded_files), text=f"Loaded {position + 1} of {len(uploaded_files)} files")
+                progress_bar.empty()
+                merged = merge_session_groups(parts, skip_loaded_days)
+                load_source = 'merge'
+                aggregates = merged['aggregates']
+                valid_rows = aggregates.row_count if aggregates is not None else 0
+                for file_report in merged['files']:
+                    skipped_note = f", {file_report['skipped_rows']:,} in hours already loaded skipped" if file_report['skipped_rows'] else ''
+                    st.markdown(f'<p class="text-gray-400 text-center">{html.escape(file_report["name"])}: {file_report["rows"]:,} valid entries{skipped_note}</p>', unsafe_allow_html=True)
+            elif uploaded_file is None:
+                # Reopen a recent dataset from the cache; it was cleaned when it was first uploaded
+                df, load_source = get_cached_dataset(recent_key)
+                if df is None:
+                    raise FileNotFoundError(f"'{recent_datasets[recent_key]['name']}' is no longer in the dataset cache. Please upload it again.")
+                data_key = recent_key
+                held_datasets.append(data_key)
+                valid_rows = len(df)
+                if not df.empty:
+                    aggregates = get_dataset_aggregates(data_key, df, sketch_columns, sketch_capacity, aggregation_backend)
+            elif streaming_mode:
+                # Stream the CSV in chunks, reporting progress as a fraction of the uploaded bytes consumed
+                progress_bar = st.progress(0.0, text="Streaming CSV...")
+                stream_key, groups, load_source = load_streamed_groups(uploaded_file, int(chunk_rows), streaming_progress_reporter(uploaded_file, progress_bar),
+                                                              sketch_columns, sketch_capacity, aggregation_backend)
+                progress_bar.empty()
+                held_datasets.append(stream_key)
+                valid_rows = int(groups['rows'].sum()) if groups is not None else 0
+                if valid_rows > 0:
+                    aggregates = summarize_groups(groups)
+            else:
+                # Read and clean the CSV, reusing the cached result when the same file was already processed
+                data_key, df, load_source = load_cleaned_frame(uploaded_file, int(parse_workers), aggregation_backend)
+                held_datasets.append(data_key)
+                valid_rows = len(df)
+                if not df.empty:
+                    # All chart aggregates come from one pass over the cleaned data, cached per dataset
+                    aggregates = get_dataset_aggregates(data_key, df, sketch_columns, sketch_capacity, aggregation_backend)
+            load_fields.update(source=load_source, rows=valid_rows)
 
         # Display success message after cleaning
-        st.markdown(f'<p class="text-green-400 mt-4 text-center">Data cleaned successfully! Showing {len(df)} valid entries.</p>', unsafe_allow_html=True)
+        st.markdown(f'<p class="text-green-400 mt-4 text-center">Data cleaned successfully! Showing {valid_rows} valid entries.</p>', unsafe_allow_html=True)
+        memory_report = df.attrs.get('memory_report') if df is not None else None
+        if memory_report:
+            # Before/after memory footprint of the compact dtype schema
+            parsed_mb = memory_report['parsed_bytes'] / (1024 * 1024)
+            cleaned_mb = memory_report['cleaned_bytes'] / (1024 * 1024)
+            saved_pct = (1 - memory_report['cleaned_bytes'] / max(memory_report['parsed_bytes'], 1)) * 100
+            st.markdown(f'<p class="text-gray-400 text-center">Memory: {parsed_mb:,.1f} MB as parsed &rarr; '
+                        f'{cleaned_mb:,.1f} MB with compact dtypes ({saved_pct:.0f}% smaller)</p>', unsafe_allow_html=True)
+        cache_stats = get_dataset_store().stats()
+        source_label = {'memory': 'memory cache', 'disk': 'disk cache', 'csv': 'CSV', 'merge': f'{len(uploaded_files)} merged files'}[load_source]
+        st.markdown(f'<p class="text-gray-400 text-center">Loaded from {source_label} &middot; '
+                    f'shared store: {cache_stats["hits"]} hits / {cache_stats["misses"]} misses / {cache_stats["evictions"]} evictions &middot; '
+                    f'{cache_stats["entries"]} cached, {cache_stats["resident_mb"]:,.1f} of {cache_stats["budget_mb"]:,.0f} MB used '
+                    f'across {cache_stats["sessions"]} sessions</p>',
+                    unsafe_allow_html=True)
 
     except Exception as e:
         # Display error message if file processing fails
         st.markdown(f'<p class="text-red-400 mt-4 text-center">Error processing file: {e}</p>', unsafe_allow_html=True)
         df = None # Reset df to None to prevent chart generation on error
+        aggregates = None
     st.markdown('</div>', unsafe_allow_html=True) # Close the data cleaning container
 
-# --- Chart Generation and Insights Display ---
-if df is not None and not df.empty:
-    st.markdown("---")
-    # Section header for charts
-    st.markdown('<h2 class="section-header" style="color: #a78bfa;">Interactive Charts</h2>', unsafe_allow_html=True)
+# Hold the datasets this session shows (none once it closes its file) so the store never evicts them while
+# they are on screen; other sessions opening the same content share them
+if 'dataset_lease' not in st.session_state:
+    st.session_state['dataset_lease'] = DatasetLease(get_dataset_store())
+st.session_state['dataset_lease'].hold(held_datasets)
+
+# --- Filters (Sidebar) ---
+# Filters are answered from a precomputed index: whole-day date ranges and category selections are added up from
+# per-day tables and cells summed when the data was loaded, so changing a filter never rescans the full frame
+FILTER_LABELS = {'platform': 'Platform', 'sentiment': 'Sentiment', 'mediatype': 'Media Type', 'location': 'Location'}
+if df is not None and aggregates is not None and not drill_mode:
+    with stage('filter.index'):
+        filter_index = get_filter_index(data_key, df)
+    first_date, last_date = (timestamp.date() for timestamp in filter_index.date_range)
+    st.sidebar.markdown('<h2 class="section-header" style="color: #d8b4fe;">Filters</h2>', unsafe_allow_html=True)
+    date_range = st.sidebar.date_input("Date range", value=(first_date, last_date), min_value=first_date, max_value=last_date)
+    filter_selections = {
+        column: st.sidebar.multiselect(label, options=list(filter_index.categories[column]), placeholder="All")
+        for column, label in FILTER_LABELS.items()
+    }
+    # While a range is being picked the widget briefly holds only its start date
+    start_date = date_range[0] if date_range else first_date
+    end_date = date_range[1] if len(date_range) > 1 else last_date
+    if (start_date, end_date) != (first_date, last_date) or any(filter_selections.values()):
+        # End date is inclusive in the widget, exclusive in the index
+        with stage('filter.aggregate') as filter_fields:
+            aggregates = filter_index.aggregate(start_date, end_date + datetime.timedelta(days=1), filter_selections)
+            filter_fields['rows'] = aggregates.row_count if aggregates is not None else 0
+        matched_rows = aggregates.row_count if aggregates is not None else 0
+        st.sidebar.markdown(f'<p class="text-gray-400">{matched_rows:,} of {len(df):,} entries match the filters.</p>', unsafe_allow_html=True)
+        if aggregates is None:
+            st.markdown('<p class="text-yellow-400 mt-4 text-center">No entries match the current filters.</p>', unsafe_allow_html=True)
+elif aggregates is not None and drill_mode:
+    st.sidebar.markdown('<p class="text-gray-400">In drill-down mode the Drill-down panel replaces the filters.</p>', unsafe_allow_html=True)
+elif aggregates is not None and len(uploaded_files) > 1:
+    st.sidebar.markdown('<p class="text-gray-400">Filters need a single dataset. Upload one file to use them.</p>', unsafe_allow_html=True)
+elif aggregates is not None and streaming_mode:
+    st.sidebar.markdown('<p class="text-gray-400">Filters need the full dataset. Turn off streaming mode to use them.</p>', unsafe_allow_html=True)
+
+# --- Drill-down (Sidebar) ---
+# Drill-down selections narrow the charts through the rollup cube. Each chart ignores the selection on its own
+# dimension (cross-filtering): the platform and location bars keep every value visible, so more can be clicked.
+DRILL_CHART_DIMENSIONS = {'sentiment': 'sentiment', 'engagement_trend': None, 'platform': 'platform', 'media_type': 'mediatype', 'location': 'location'}
 
-    # Helper function to render insights
-    def render_insights(insights):
-        for insight in insights:
-            st.markdown(f'<p class="insight-paragraph">{insight}</p>', unsafe_allow_html=True)
-
-    # --- Insight Generation Functions ---
-    # These functions calculate and return a list of textual insights based on chart data
-    def get_sentiment_insights(sentiment_counts):
-        total = sum(sentiment_counts.values())
-        sorted_sentiments = sorted(sentiment_counts.items(), key=lambda item: item[1], reverse=True)
-        insights = []
-        insights.append(f"This chart describes the distribution of sentiment (positive/negative/neutral) towards a brand, campaign, or topic, providing a quick snapshot of public perception.")
-        if len(sorted_sentiments) > 0:
-            insights.append(f"1. The dominant sentiment is \"{sorted_sentiments[0][0]}\" accounting for {((sorted_sentiments[0][1] / total) * 100):.1f}% of all entries. This indicates the primary public opinion.")
-        if len(sorted_sentiments) > 1:
-            insights.append(f"2. \"{sorted_sentiments[1][0]}\" is the second most common sentiment, showing varied public opinion.")
-        if len(sorted_sentiments) > 2:
-            insights.append(f"3. Understanding the sentiment distribution is crucial for crafting effective communication strategies.")
-        
-        # Consolidated Recommendation
-        insights.append(f"Recommendation: If dominant sentiment is negative, develop a crisis communication plan. If positive, amplify successful content. If neutral, engage to convert to positive advocates.")
-        return insights
-
-    def get_engagement_trend_insights(dates, engagements):
-        insights = []
-        if len(dates) == 0: return insights
-        insights.append(f"This chart shows fluctuations in content engagement over time, ideal for tracking media campaign performance and identifying peaks or declines. It provides a dynamic view of audience interaction.")
-
-        max_engagement = max(engagements)
-        min_engagement = min(engagements)
-        # Find index and get corresponding date, format as string
-        max_date_str = dates[engagements.index(max_engagement)].strftime('%Y-%m-%d')
-        min_date_str = dates[engagements.index(min_engagement)].strftime('%Y-%m-%d')
-
-
-        insights.append(f"1. Peak engagement occurred around {max_date_str}, reaching {max_engagement:,.0f} total engagements. Analyze this date to identify triggers for the surge.")
-        insights.append(f"2. The lowest engagement period was around {min_date_str}, with only {min_engagement:,.0f} engagements. Investigate this decline to prevent similar issues.")
-
-        first_half_engagements = sum(engagements[:len(engagements) // 2])
-        second_half_engagements = sum(engagements[len(engagements) // 2:])
-
-        if second_half_engagements > first_half_engagements:
-            insights.append('3. Engagement trends show an increase in the latter half, indicating positive results from your content strategy.')
-        elif second_half_engagements < first_half_engagements:
-            insights.append('3. A decline in engagement is observed in the latter half, suggesting deeper analysis into content performance is needed.')
+def clear_drill_down():
+    for column in FILTER_LABELS:
+        st.session_state[f'drill_{column}'] = []
+
+chart_aggregates = dict.fromkeys(DRILL_CHART_DIMENSIONS, aggregates) # Outside drill-down mode every chart shares one set
+if drill_mode and aggregates is not None:
+    with stage('cube.build'):
+        if merged is not None:
+            if merged['cube'] is None:
+                merged['cube'] = RollupCube(merged['groups'])
+            rollup_cube = merged['cube']
+        elif df is not None:
+            rollup_cube = get_rollup_cube(data_key, lambda: group_media_data(df, grouping_frequency(df['date'])))
         else:
-            insights.append('3. Engagement levels remained relatively stable, indicating consistent audience interaction.')
-        
-        # Consolidated Recommendation
-        insights.append(f"Recommendation: Replicate successful content strategies during peak periods. Analyze content from low engagement periods to identify weaknesses and adjust your content calendar. Continue current strategies for growth, or explore new tactics to break stagnation.")
-        return insights
-
-    def get_platform_insights(platform_engagements):
-        sorted_platforms = sorted(platform_engagements.items(), key=lambda item: item[1], reverse=True)
-        insights = []
-        insights.append(f"This chart compares engagement performance across social media platforms or news portals, helping to identify the most effective platforms for reach and interaction. This is crucial for optimizing resource allocation.")
-        if len(sorted_platforms) > 0:
-            insights.append(f"1. \"{sorted_platforms[0][0]}\" is the leading platform, generating {sorted_platforms[0][1]:,.0f} engagements. This highlights your most effective channel.")
-        if len(sorted_platforms) > 1:
-            insights.append(f"2. \"{sorted_platforms[1][0]}\" also shows strong performance with {sorted_platforms[1][1]:,.0f} engagements, indicating significant potential for diversification.")
-        insights.append('3. Disparities in engagement across platforms emphasize the importance of strategically allocating resources for the highest engagement ROI.')
-        
-        # Consolidated Recommendation
-        insights.append(f"Recommendation: Allocate more budget/resources to leading platforms and analyze successful content types for cross-platform adaptation. Consider reducing investment in underperforming platforms or re-evaluating their role in your overall media strategy.")
-        return insights
-
-    def get_media_type_insights(media_type_counts):
-        total = sum(media_type_counts.values())
-        sorted_media_types = sorted(media_type_counts.items(), key=lambda item: item[1], reverse=True)
-        insights = []
-        insights.append(f"This chart analyzes the proportion of media types, providing insight into your audience's most preferred content formats. This is key for an audience-centric content strategy.")
-        if len(sorted_media_types) > 0:
-            insights.append(f"1. \"{sorted_media_types[0][0]}\" is the most frequently used media type, accounting for {((sorted_media_types[0][1] / total) * 100):.1f}% of content. This indicates a clear audience preference.")
-        if len(sorted_media_types) > 1:
-            insights.append(f"2. \"{sorted_media_types[1][0]}\" is the second most common, indicating audiences also respond well to this format.")
-        insights.append('3. Analyzing engagement rates per media type is crucial for optimizing content strategy and discovering new opportunities.')
-        
-        # Consolidated Recommendation
-        insights.append(f"Recommendation: Prioritize creating more content in preferred formats. Maintain a healthy mix of content by continuing to produce other media types, and explore ways to enhance their impact. Experiment with converting high-performing content between formats.")
-        return insights
-
-    def get_location_insights(sorted_locations):
-        insights = []
-        insights.append(f"This chart identifies geographical locations with the highest total engagement, relevant for audience targeting or localized content production. This helps inform regional marketing decisions.")
-        if len(sorted_locations) > 0:
-            insights.append(f"1. The top location for engagements is \"{sorted_locations[0][0]}\" with {sorted_locations[0][1]:,.0f} total engagements. This indicates audiences in this region are highly active.")
-        if len(sorted_locations) > 1:
-            insights.append(f"2. \"{sorted_locations[1][0]}\" is the second highest, indicating key geographical areas for focus.")
-        insights.append('3. Knowing high-engagement locations allows you to design more targeted marketing campaigns or develop culturally relevant content.')
-        
-        # Consolidated Recommendation
-        insights.append(f"Recommendation: Launch localized campaigns, run geo-targeted ads, or create region-specific content to deepen engagement in top locations. Explore expanding your presence or tailoring content for secondary high-engagement locations.")
-        return insights
+            rollup_cube = get_rollup_cube(stream_key, lambda: groups)
+    st.sidebar.markdown('<h2 class="section-header" style="color: #d8b4fe;">Drill-down</h2>', unsafe_allow_html=True)
+    drill_selections = {}
+    for column, label in FILTER_LABELS.items():
+        options = list(rollup_cube.categories[column])
+        # Bar clicks arrive after these widgets were drawn and are applied here, on the run they trigger.
+        # Values of a previously loaded dataset are dropped, since the widget only accepts current options.
+        selected = st.session_state.pop(f'drill_pending_{column}', None) or st.session_state.get(f'drill_{column}', [])
+        st.session_state[f'drill_{column}'] = [value for value in selected if value in options]
+        drill_selections[column] = st.sidebar.multiselect(label, options=options, key=f'drill_{column}', placeholder="All")
+    st.sidebar.button("Clear drill-down", on_click=clear_drill_down)
+    if any(drill_selections.values()):
+        with stage('cube.aggregate') as cube_fields:
+            # Charts whose own dimension is not selected see the same cells, so each distinct selection is summarized once
+            by_selection = {}
+            for chart, dimension in DRILL_CHART_DIMENSIONS.items():
+                selection = tuple((column, tuple(values)) for column, values in drill_selections.items() if values and column != dimension)
+                if selection not in by_selection:
+                    by_selection[selection] = rollup_cube.aggregate(dict(selection)) if selection else aggregates
+                chart_aggregates[chart] = by_selection[selection]
+            aggregates = chart_aggregates['engagement_trend'] # Narrowed by every selection
+            cube_fields['rows'] = aggregates.row_count if aggregates is not None else 0
+        matched_rows = aggregates.row_count if aggregates is not None else 0
+        st.sidebar.markdown(f'<p class="text-gray-400">{matched_rows:,} of {rollup_cube.row_count:,} entries in the selection.</p>', unsafe_allow_html=True)
+        if aggregates is None:
+            st.markdown('<p class="text-yellow-400 mt-4 text-center">No entries match the drill-down selection.</p>', unsafe_allow_html=True)
 
-    # --- Chart 1: Sentiment Breakdown (Pie Chart) ---
-    col1, col2 = st.columns(2) # Create two columns for charts
+# --- Chart Generation and Insights Display ---
+# Every chart and its insights is a fragment: interacting with a widget inside one (its toggle, the trend
+# granularity) reruns only that fragment instead of the whole script. Charts whose toggle is off are never
+# built, so the first paint only pays for the charts that start open.
+def render_insights(insights):
+    for insight in insights:
+        st.markdown(f'<p class="insight-paragraph">{insight}</p>', unsafe_allow_html=True)
 
-    with col1:
-        st.markdown('<div class="plotly-container" style="background-color: #1f2937; border-color: #4b5563; margin-bottom: 32px;">'
-                    '<h2 class="section-header" style="color: #93c5fd;">3.1. Sentiment Breakdown (Pie Chart)</h2>', unsafe_allow_html=True)
-        sentiment_counts = df['sentiment'].value_counts()
-        fig_sentiment = px.pie(
-            names=sentiment_counts.index,
-            values=sentiment_counts.values,
-            hole=0.4,
-            title='Sentiment Breakdown',
-            color_discrete_sequence=['#636EFA', '#EF553B', '#00CC96', '#FFA15A', '#19D3F3']
-        )
-        # Update layout for dark theme
-        fig_sentiment.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='#E0E0E0', family='Inter, sans-serif'),
-            legend=dict(font=dict(color='#E0E0E0')),
-            height=400, # Fixed height for consistency
-            margin=dict(l=20, r=20, b=20, t=60) # Adjust margins
-        )
-        st.plotly_chart(fig_sentiment, use_container_width=True) # Display chart in Streamlit
+def render_approximation_note(aggregates, column, label):
+    # Says when a chart's figures come from a heavy-hitter sketch, and how far off they can be
+    approximation = aggregates.approximations.get(column)
+    if approximation is None:
+        return
+    if approximation['error_bound'] == 0:
+        note = f"{label} figures come from a heavy-hitter sketch that kept every value, so they are exact."
+    else:
+        share = approximation['error_bound'] / max(approximation['total_weight'], 1)
+        note = (f"Approximate: {label.lower()} figures come from a heavy-hitter sketch with {approximation['capacity']:,} counters. "
+                f"Each value may be up to {approximation['error_bound']:,.0f} engagements ({share:.2%} of all engagements) below its exact total.")
+    st.markdown(f'<p class="text-yellow-400">{note}</p>', unsafe_allow_html=True)
+
+def render_drill_chart(fig, column):
+    # Bar chart whose clicked bars become the drill-down selection on `column`. The chart sits in a fragment,
+    # so the click is parked in session state and a full rerun hands it to the Drill-down widgets. An empty
+    # selection (the chart was redrawn or deselected) is only recorded, so clearing stays with the sidebar.
+    event = st.plotly_chart(fig, use_container_width=True, theme=None, key=f'drill_chart_{column}', on_select='rerun', selection_mode='points')
+    clicked = sorted({point['x'] for point in event.selection.points})
+    if clicked == st.session_state.get(f'drill_clicked_{column}', []):
+        return
+    st.session_state[f'drill_clicked_{column}'] = clicked
+    if clicked:
+        st.session_state[f'drill_pending_{column}'] = clicked
+        st.rerun()
+
+def chart_enabled(chart):
+    # Every chart is shown by default; switching one off skips building its figure and insights on reruns
+    return st.toggle("Show chart", value=True, key=f"show_{chart}")
+
+@st.experimental_fragment
+def sentiment_chart_fragment(aggregates):
+    # --- Chart 1: Sentiment Breakdown (Pie Chart) ---
+    st.markdown('<div class="plotly-container" style="background-color: #1f2937; border-color: #4b5563; margin-bottom: 32px;">'
+                '<h2 class="section-header" style="color: #93c5fd;">3.1. Sentiment Breakdown (Pie Chart)</h2>', unsafe_allow_html=True)
+    if chart_enabled('sentiment'):
+        with stage('figure.sentiment'):
+            fig_sentiment = get_cached_figure('sentiment', aggregates.sentiment_counts, build_sentiment_figure, aggregates)
+        with stage('render.sentiment'): # Figure serialization happens inside st.plotly_chart
+            # theme=None: the figure is styled by the media_dark templates, which Streamlit's theme would override
+            st.plotly_chart(fig_sentiment, use_container_width=True, theme=None) # Display chart in Streamlit
         st.markdown('<h3 class="insights-title" style="color: #bfdbfe;">Top 3 Insights:</h3>', unsafe_allow_html=True)
-        render_insights(get_sentiment_insights(sentiment_counts.to_dict()))
-        st.markdown('</div>', unsafe_allow_html=True)
+        with stage('insights.sentiment'):
+            render_insights(get_sentiment_insights(aggregates.sentiment_counts))
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    with col2:
-        # --- Chart 2: Engagement Trend over Time (Line Chart) ---
-        st.markdown('<div class="plotly-container" style="background-color: #1f2937; border-color: #4b5563; margin-bottom: 32px;">'
-                    '<h2 class="section-header" style="color: #6ee7b7;">3.2. Engagement Trend Over Time (Line Chart)</h2>', unsafe_allow_html=True)
-        # Resample data to daily frequency and sum engagements for trend analysis
-        daily_engagements = df.set_index('date').resample('D')['engagements'].sum().reset_index()
-        fig_engagement_trend = px.line(
-            daily_engagements,
-            x='date',
-            y='engagements',
-            title='Engagement Trend Over Time',
-            markers=True,
-            line_shape='linear',
-            color_discrete_sequence=['#636EFA']
-        )
-        fig_engagement_trend.update_layout(
-            xaxis_title='Date',
-            yaxis_title='Total Engagements',
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='#E0E0E0', family='Inter, sans-serif'),
-            xaxis=dict(gridcolor='#444'), # Customize grid color
-            yaxis=dict(gridcolor='#444'),
-            height=400, # Fixed height
-            margin=dict(l=60, r=20, b=60, t=60) # Adjust margins
+@st.experimental_fragment
+def trend_chart_fragment(aggregates):
+    # --- Chart 2: Engagement Trend over Time (Line Chart) ---
+    st.markdown('<div class="plotly-container" style="background-color: #1f2937; border-color: #4b5563; margin-bottom: 32px;">'
+                '<h2 class="section-header" style="color: #6ee7b7;">3.2. Engagement Trend Over Time (Line Chart)</h2>', unsafe_allow_html=True)
+    if chart_enabled('engagement_trend'):
+        # Bucket size adapts to the date span unless the user picks one; hourly is only offered for short spans
+        frequencies = list(TREND_FREQUENCIES)
+        trend_granularity = st.selectbox(
+            "Trend granularity",
+            options=['auto'] + frequencies[frequencies.index(aggregates.trend_frequency):],
+            format_func=lambda freq: "Auto" if freq == 'auto' else TREND_FREQUENCIES[freq]
         )
-        st.plotly_chart(fig_engagement_trend, use_container_width=True)
+        trend_granularity = resolve_trend_frequency(aggregates, trend_granularity)
+        with stage('figure.trend_downsample'):
+            trend_series, bucket_count = prepare_trend_series(aggregates.trend_engagements, aggregates.trend_frequency, trend_granularity)
+        with stage('figure.engagement_trend'):
+            fig_engagement_trend = get_cached_figure('engagement_trend', trend_series, build_trend_figure, trend_series)
+        with stage('render.engagement_trend'):
+            st.plotly_chart(fig_engagement_trend, use_container_width=True, theme=None)
+        downsampled_note = f', downsampled to {len(trend_series):,} points' if len(trend_series) < bucket_count else ''
+        st.markdown(f'<p class="text-gray-400">{TREND_FREQUENCIES[trend_granularity]} buckets: {bucket_count:,}{downsampled_note}.</p>', unsafe_allow_html=True)
         st.markdown('<h3 class="insights-title" style="color: #d1fae5;">Top 3 Insights:</h3>', unsafe_allow_html=True)
-        # Ensure dates are in a format compatible with insight function (e.g., datetime objects or strings)
-        render_insights(get_engagement_trend_insights(daily_engagements['date'].tolist(), daily_engagements['engagements'].tolist()))
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    col3, col4 = st.columns(2) # Create new columns for the next set of charts
+        # Insights always use the full-resolution daily series, never the downsampled plot data
+        with stage('insights.engagement_trend'):
+            render_insights(get_engagement_trend_insights(aggregates.daily_engagements))
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    with col3:
-        # --- Chart 3: Platform Engagements (Bar Chart) ---
-        st.markdown('<div class="plotly-container" style="background-color: #1f2937; border-color: #4b5563; margin-bottom: 32px;">'
-                    '<h2 class="section-header" style="color: #f87171;">3.3. Platform Engagements (Bar Chart)</h2>', unsafe_allow_html=True)
-        platform_engagements = df.groupby('platform')['engagements'].sum().reset_index()
-        fig_platform = px.bar(
-            platform_engagements,
-            x='platform',
-            y='engagements',
-            title='Platform Engagements',
-            color_discrete_sequence=['#EF553B']
-        )
-        fig_platform.update_layout(
-            xaxis_title='Platform',
-            yaxis_title='Total Engagements',
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='#E0E0E0', family='Inter, sans-serif'),
-            xaxis=dict(gridcolor='#444'),
-            yaxis=dict(gridcolor='#444'),
-            height=400, # Fixed height
-            margin=dict(l=60, r=20, b=60, t=60) # Adjust margins
-        )
-        st.plotly_chart(fig_platform, use_container_width=True)
+@st.experimental_fragment
+def platform_chart_fragment(aggregates, cross_filter=False):
+    # --- Chart 3: Platform Engagements (Bar Chart) ---
+    st.markdown('<div class="plotly-container" style="background-color: #1f2937; border-color: #4b5563; margin-bottom: 32px;">'
+                '<h2 class="section-header" style="color: #f87171;">3.3. Platform Engagements (Bar Chart)</h2>', unsafe_allow_html=True)
+    if chart_enabled('platform'):
+        with stage('figure.platform'):
+            fig_platform = get_cached_figure('platform', aggregates.platform_engagements, build_platform_figure, aggregates)
+        with stage('render.platform'):
+            if cross_filter:
+                render_drill_chart(fig_platform, 'platform')
+            else:
+                st.plotly_chart(fig_platform, use_container_width=True, theme=None)
+        render_approximation_note(aggregates, 'platform', 'Platform')
         st.markdown('<h3 class="insights-title" style="color: #fca5a5;">Top 3 Insights:</h3>', unsafe_allow_html=True)
-        render_insights(get_platform_insights(platform_engagements.set_index('platform')['engagements'].to_dict()))
-        st.markdown('</div>', unsafe_allow_html=True)
+        with stage('insights.platform'):
+            render_insights(get_platform_insights(aggregates.platform_engagements))
+        st.markdown('<h3 class="insights-title" style="color: #fca5a5;">Anomaly Watch:</h3>', unsafe_allow_html=True)
+        with stage('insights.platform_anomalies'):
+            render_insights(get_platform_anomaly_insights(aggregates.daily_platform_engagements))
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    with col4:
-        # --- Chart 4: Media Type Mix (Pie Chart) ---
-        st.markdown('<div class="plotly-container" style="background-color: #1f2937; border-color: #4b5563; margin-bottom: 32px;">'
-                    '<h2 class="section-header" style="color: #fcd34d;">3.4. Media Type Mix (Pie Chart)</h2>', unsafe_allow_html=True)
-        media_type_counts = df['mediatype'].value_counts()
-        fig_media_type = px.pie(
-            names=media_type_counts.index,
-            values=media_type_counts.values,
-            hole=0.4,
-            title='Media Type Mix',
-            color_discrete_sequence=['#00CC96', '#FFA15A', '#19D3F3', '#FF6692', '#B6E880']
-        )
-        fig_media_type.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='#E0E0E0', family='Inter, sans-serif'),
-            legend=dict(font=dict(color='#E0E0E0')),
-            height=400, # Fixed height
-            margin=dict(l=20, r=20, b=20, t=60) # Adjust margins
-        )
-        st.plotly_chart(fig_media_type, use_container_width=True)
+@st.experimental_fragment
+def media_type_chart_fragment(aggregates):
+    # --- Chart 4: Media Type Mix (Pie Chart) ---
+    st.markdown('<div class="plotly-container" style="background-color: #1f2937; border-color: #4b5563; margin-bottom: 32px;">'
+                '<h2 class="section-header" style="color: #fcd34d;">3.4. Media Type Mix (Pie Chart)</h2>', unsafe_allow_html=True)
+    if chart_enabled('media_type'):
+        with stage('figure.media_type'):
+            fig_media_type = get_cached_figure('media_type', aggregates.media_type_counts, build_media_type_figure, aggregates)
+        with stage('render.media_type'):
+            st.plotly_chart(fig_media_type, use_container_width=True, theme=None)
         st.markdown('<h3 class="insights-title" style="color: #fde68a;">Top 3 Insights:</h3>', unsafe_allow_html=True)
-        render_insights(get_media_type_insights(media_type_counts.to_dict()))
-        st.markdown('</div>', unsafe_allow_html=True)
+        with stage('insights.media_type'):
+            render_insights(get_media_type_insights(aggregates.media_type_counts))
+    st.markdown('</div>', unsafe_allow_html=True)
 
+@st.experimental_fragment
+def location_chart_fragment(aggregates, cross_filter=False):
     # --- Chart 5: Top 5 Locations (Bar Chart) ---
-    # This chart spans full width, so it's not placed in a column with others
     st.markdown('<div class="plotly-container" style="background-color: #1f2937; border-color: #4b5563; margin-bottom: 32px;">'
                 '<h2 class="section-header" style="color: #a78bfa;">3.5. Top 5 Locations by Engagements (Bar Chart)</h2>', unsafe_allow_html=True)
-    # Group by location, sum engagements, get top 5, and reset index for Plotly
-    location_engagements = df.groupby('location')['engagements'].sum().nlargest(5).reset_index()
-    fig_location = px.bar(
-        location_engagements,
-        x='location',
-        y='engagements',
-        title='Top 5 Locations by Engagements',
-        color_discrete_sequence=['#FFA15A']
-    )
-    fig_location.update_layout(
-        xaxis_title='Location',
-        yaxis_title='Total Engagements',
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='#E0E0E0', family='Inter, sans-serif'),
-        xaxis=dict(gridcolor='#444'),
-        yaxis=dict(gridcolor='#444'),
-        height=400, # Fixed height
-        margin=dict(l=60, r=20, b=60, t=60) # Adjust margins
-    )
-    st.plotly_chart(fig_location, use_container_width=True)
-    st.markdown('<h3 class="insights-title" style="color: #d8b4fe;">Top 3 Insights:</h3>', unsafe_allow_html=True)
-    # Convert DataFrame to a list of lists for insight function
-    render_insights(get_location_insights(location_engagements.values.tolist()))
+    if chart_enabled('location'):
+        with stage('figure.location'):
+            fig_location = get_cached_figure('location', aggregates.top_locations, build_location_figure, aggregates)
+        with stage('render.location'):
+            if cross_filter:
+                render_drill_chart(fig_location, 'location')
+            else:
+                st.plotly_chart(fig_location, use_container_width=True, theme=None)
+        render_approximation_note(aggregates, 'location', 'Location')
+        st.markdown('<h3 class="insights-title" style="color: #d8b4fe;">Top 3 Insights:</h3>', unsafe_allow_html=True)
+        with stage('insights.location'):
+            render_insights(get_location_insights(aggregates.top_locations))
     st.markdown('</div>', unsafe_allow_html=True)
 
+if aggregates is not None:
+    st.markdown("---")
+    # Section header for charts
+    st.markdown('<h2 class="section-header" style="color: #a78bfa;">Interactive Charts</h2>', unsafe_allow_html=True)
+
+    col1, col2 = st.columns(2) # Create two columns for charts
+    with col1:
+        sentiment_chart_fragment(chart_aggregates['sentiment'])
+    with col2:
+        trend_chart_fragment(aggregates)
+
+    col3, col4 = st.columns(2) # Create new columns for the next set of charts
+    with col3:
+        platform_chart_fragment(chart_aggregates['platform'], drill_mode)
+    with col4:
+        media_type_chart_fragment(chart_aggregates['media_type'])
+
+    # This chart spans full width, so it's not placed in a column with others
+    location_chart_fragment(chart_aggregates['location'], drill_mode)
+
     # --- Concluding Recommendations Section ---
     st.markdown("---")
     st.markdown('<div class="plotly-container" style="background-color: #1f2937; border-color: #4b5563; margin-top: 32px;">'
@@ -474,3 +1034,38 @@ if df is not None and not df.empty:
                 '</li>'
                 '</ul>'
                 '</div>', unsafe_allow_html=True)
+
+# --- Performance Panel ---
+if perf_recorder is not None:
+    perf_log_path = os.environ.get('DASHBOARD_PERF_LOG')
+    if perf_log_path:
+        perf_recorder.append_to_log(perf_log_path)
+    with st.expander("Performance"):
+        stage_rows = [{
+            'Stage': '\u2003' * record['depth'] + record['stage'], # Nested stages are indented under their parent
+            'Time (ms)': round(record['seconds'] * 1000, 1),
+            'Peak RSS growth (MB)': None if record['rss_peak_delta_bytes'] is None else round(record['rss_peak_delta_bytes'] / (1024 * 1024), 1),
+            'Rows': record.get('rows'),
+        } for record in perf_recorder.ordered_records()]
+        st.dataframe(stage_rows, use_container_width=True, hide_index=True)
+        st.markdown(f'<p class="text-gray-400">Script run: {perf_recorder.total_seconds() * 1000:,.0f} ms in total.</p>', unsafe_allow_html=True)
+        json_col, trace_col = st.columns(2)
+        json_col.download_button("Download JSON lines", perf_recorder.to_json_lines(), file_name=f"perf-{perf_recorder.run_id}.jsonl", mime="application/x-ndjson")
+        trace_col.download_button("Download Chrome trace", perf_recorder.to_chrome_trace(), file_name=f"perf-{perf_recorder.run_id}.json", mime="application/json",
+                                  help="Open in chrome://tracing or https://ui.perfetto.dev")
+
+# --- Admin: Shared Dataset Store ---
+# Resident datasets, their memory and the sessions holding them; shown only with ?admin=<DASHBOARD_ADMIN_TOKEN>
+admin_token = os.environ.get('DASHBOARD_ADMIN_TOKEN')
+if admin_token and hmac.compare_digest(st.query_params.get('admin', ''), admin_token):
+    with st.expander("Shared dataset store"):
+        store_stats = get_dataset_store().stats()
+        st.markdown(f'<p class="text-gray-400">{store_stats["resident_mb"]:,.1f} of {store_stats["budget_mb"]:,.0f} MB used by '
+                    f'{store_stats["entries"]} entries &middot; {store_stats["sessions"]} sessions &middot; '
+                    f'{store_stats["evictions"]} evictions</p>', unsafe_allow_html=True)
+        st.dataframe([{
+            'Dataset': row['name'] or row['dataset'],
+            'Entries': row['entries'],
+            'Memory (MB)': round(row['bytes'] / (1024 * 1024), 1),
+            'Sessions': row['sessions'], # 0 means the dataset is evicted first when space is needed
+        } for row in get_dataset_store().resident_datasets()], use_container_width=True, hide_index=True)
@@ -0,0 +1,230 @@
+# Pluggable engines for the heavy part of the pipeline: reading and cleaning an export, and the grouped pass the
+# five chart aggregations are rolled up from. pandas is the default and always available. DuckDB is an optional
+# embedded columnar engine: it queries the CSV or Parquet file directly, multithreaded, and spills to disk under
+# a memory limit instead of holding every row in memory.
+#
+# Every backend returns the same things, so the charts and insights cannot tell them apart:
+#   clean(source)      -> cleaned DataFrame, same columns and dtypes as read_media_csv
+#   group(source)      -> grouped frame (time bucket x dimensions -> rows, engagements), as group_media_data
+#   aggregates(source) -> DashboardAggregates, summarized from the grouped frame by the shared summarizers
+# `source` is a CSV or Parquet path, a file-like CSV upload, or (for group/aggregates) an already cleaned frame.
+# `python benchmark.py equivalence` checks the backends against each other.
+import datetime
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+
+from pipeline import (
+    CATEGORICAL_SCHEMA, DATE_FORMAT_SAMPLE_SIZE, DIMENSION_COLUMNS, apply_schema, clean_media_data,
+    group_media_data, grouping_frequency, infer_date_format, read_media_csv, summarize_groups,
+)
+from perf import stage
+
+try:
+    import duckdb # Optional; only the pandas backend is offered without it
+except ImportError:
+    duckdb = None
+
+def is_parquet(source):
+    return isinstance(source, str) and source.lower().endswith('.parquet')
+
+class PandasBackend:
+    # The reference engine: eager pandas, with the whole cleaned table in memory
+    name = 'pandas'
+    available = True
+
+    def clean(self, source):
+        if is_parquet(source):
+            return clean_media_data(pd.read_parquet(source))
+        return read_media_csv(source)
+
+    def group(self, source):
+        df = source if isinstance(source, pd.DataFrame) else self.clean(source)
+        with stage('aggregate.group', rows=len(df)) as fields:
+            groups = group_media_data(df, grouping_frequency(df['date']))
+            fields['groups'] = len(groups)
+        return groups
+
+    def aggregates(self, source):
+        return summarize_groups(self.group(source))
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+class DuckDBBackend:
+    # Cleaning and grouping run as SQL over the file itself. Only the grouped cells (or, for clean(), the cleaned
+    # rows) are materialized as a DataFrame. memory_limit is a DuckDB size string such as '4GB'; past it DuckDB
+    # spills to temp_directory.
+    name = 'duckdb'
+    available = duckdb is not None
+
+    def __init__(self, threads=None, memory_limit=None, temp_directory=None):
+        self.config = {}
+        if threads:
+            self.config['threads'] = threads
+        if memory_limit:
+            self.config['memory_limit'] = memory_limit
+        if temp_directory:
+            self.config['temp_directory'] = temp_directory
+
+    def _run(self, source, query):
+        # Run query(connection, cleaned relation) on a fresh in-memory database. A connection per call keeps
+        # concurrent dashboard sessions independent. Uploads are spooled to a temporary file for DuckDB to scan.
+        spooled = None
+        if not isinstance(source, (str, pd.DataFrame)):
+            spooled = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+            with spooled:
+                source.seek(0)
+                shutil.copyfileobj(source, spooled)
+            source = spooled.name
+        try:
+            with duckdb.connect(config=self.config) as connection:
+                return query(connection, *self._cleaned_relation(connection, source))
+        finally:
+            if spooled is not None:
+                os.remove(spooled.name)
+
+    def _cleaned_relation(self, connection, source):
+        # SQL version of clean_media_data (apart from the final dtypes): normalized column names, dates parsed
+        # with one format inferred from the head of the file exactly like the pandas path, rows with an invalid
+        # date dropped, and missing engagements counted as 0. Nothing is read until the relation is queried.
+        # Returned with the timezone of the dates (None when naive), which pandas would keep on the column.
+        if isinstance(source, pd.DataFrame):
+            raw = connection.from_df(source)
+        elif is_parquet(source):
+            raw = connection.read_parquet(source)
+        else:
+            # Every CSV column is read as text: DuckDB's type sniffer only samples the head of the file, so a late
+            # 'not a date' or 'n/a' would abort the scan, and it may read 03/04/2023 as day-first where pandas
+            # does not. The same strings as pandas count as missing values.
+            raw = connection.read_csv(source, all_varchar=True, na_values=sorted(STR_NA_VALUES))
+        columns = {str(column).strip().lower().replace(' ', ''): column for column in raw.columns}
+        types = dict(zip(raw.columns, (str(column_type) for column_type in raw.types)))
+        date_column = quote_identifier(columns['date'])
+        tz = None
+        if types[columns['date']] == 'VARCHAR':
+            sample = raw.limit(DATE_FORMAT_SAMPLE_SIZE * 10).df()[columns['date']]
+            date_format = infer_date_format(sample)
+            if date_format is None:
+                date_expression = f"TRY_CAST({date_column} AS TIMESTAMP)"
+            else:
+                if '%z' in date_format:
+                    # DuckDB's %z takes numeric offsets only; pandas also reads a trailing 'Z' as UTC
+                    date_column = f"regexp_replace({date_column}, 'Z$', '+00:00')"
+                date_expression = f"TRY_STRPTIME({date_column}, '{date_format.replace(chr(39), chr(39) * 2)}')"
+                if '%z' in date_format:
+                    # An offset in the format gives TIMESTAMPTZ; pandas keeps the file's offset as a fixed-offset
+                    # timezone (UTC for 'Z'), so the sample's is used. Mixed offsets leave pandas with plain
+                    # objects; those are read as UTC.
+                    parsed = pd.to_datetime(sample, errors='coerce', format=date_format)
+                    tz = getattr(parsed.dtype, 'tz', None) or datetime.timezone.utc
+        elif types[columns['date']] == 'TIMESTAMP WITH TIME ZONE':
+            tz = self._source_timezone(source, columns['date'])
+            date_expression = date_column
+        else:
+            date_expression = f"CAST({date_column} AS TIMESTAMP)" # Parquet or an already cleaned frame
+        if tz is not None:
+            date_expression = self._wall_clock(connection, date_expression, tz)
+        selected = []
+        for name, column in columns.items():
+            if name == 'date':
+                selected.append(f'{date_expression} AS "date"')
+            elif name == 'engagements':
+                selected.append(f"COALESCE(TRY_CAST({quote_identifier(column)} AS DOUBLE), 0) AS engagements")
+            else:
+                selected.append(f"{quote_identifier(column)} AS {quote_identifier(name)}")
+        return raw.project(', '.join(selected)).filter('"date" IS NOT NULL'), tz
+
+    @staticmethod
+    def _source_timezone(source, column):
+        # Timezone pandas reads a timezone-aware Parquet or frame column with
+        if isinstance(source, pd.DataFrame):
+            return source[column].dt.tz
+        import pyarrow.parquet # Already needed by pandas to read Parquet
+        return pyarrow.parquet.read_schema(source).empty_table().to_pandas()[column].dt.tz
+
+    @staticmethod
+    def _wall_clock(connection, expression, tz):
+        # Hours and days are truncated on local wall-clock time, as pandas does on a timezone-aware column. A fixed
+        # offset (all a parsed offset can be) is added to the UTC instant, giving naive local timestamps; a named
+        # zone becomes the session timezone, so DuckDB truncates in it and returns timestamps in it.
+        offset = tz.utcoffset(None)
+        if offset is None:
+            connection.execute(f"SET TimeZone = '{str(tz).replace(chr(39), chr(39) * 2)}'")
+            return expression
+        return f"make_timestamp(epoch_us({expression}) + {offset // datetime.timedelta(microseconds=1)})"
+
+    @staticmethod
+    def _localize(dates, tz):
+        # pandas' nanosecond datetimes, with the source's timezone put back on naive local timestamps
+        if tz is None:
+            return dates.astype('datetime64[ns]')
+        if dates.dt.tz is None:
+            return dates.astype('datetime64[ns]').dt.tz_localize(tz)
+        return dates.dt.tz_convert(tz).dt.as_unit('ns')
+
+    @staticmethod
+    def _numeric_dimensions(df):
+        # Dimensions come back as text; pandas reads a column whose values are all numbers as int64 (float64
+        # when some are missing), so such columns are converted the same way
+        for column in DIMENSION_COLUMNS:
+            if df[column].dtype == object:
+                values = pd.to_numeric(df[column], errors='coerce')
+                if values.notna().sum() == df[column].notna().sum():
+                    df[column] = values
+        return df
+
+    def clean(self, source):
+        with stage('duckdb.clean') as fields:
+            df, tz = self._run(source, lambda connection, cleaned, tz: (cleaned.df(), tz))
+            df['date'] = self._localize(df['date'], tz)
+            df = apply_schema(self._numeric_dimensions(df))
+            fields['rows'] = len(df)
+        return df
+
+    def group(self, source):
+        with stage('duckdb.group') as fields:
+            groups, whole_numbers, tz = self._run(source, self._group_query)
+            fields['groups'] = len(groups)
+        groups['date'] = self._localize(groups['date'], tz)
+        groups['rows'] = groups['rows'].astype('int64')
+        # pandas keeps engagements as integers when every cleaned value is a whole number
+        groups['engagements'] = groups['engagements'].astype('int64' if whole_numbers else 'float64')
+        return self._numeric_dimensions(groups).astype({column: CATEGORICAL_SCHEMA[column] for column in DIMENSION_COLUMNS})
+
+    def _group_query(self, connection, cleaned, tz):
+        # One scan of the source into hourly cells; a long date span is then rolled up to days from those cells.
+        # The span is measured on the raw timestamps, like grouping_frequency does on the pandas side.
+        dimensions = ', '.join(DIMENSION_COLUMNS)
+        cleaned.create_view('cleaned')
+        connection.execute(f"""
+            CREATE TEMP TABLE cells AS
+            SELECT date_trunc('hour', "date") AS "date", {dimensions}, count(*) AS "rows", sum(engagements) AS engagements,
+                   bool_and(engagements = floor(engagements)) AS whole_numbers, min("date") AS first_date, max("date") AS last_date
+            FROM cleaned GROUP BY ALL
+        """)
+        first, last, whole_numbers = connection.execute('SELECT min(first_date), max(last_date), bool_and(whole_numbers) FROM cells').fetchone()
+        if first is not None and grouping_frequency(pd.Series([pd.Timestamp(first), pd.Timestamp(last)])) == 'D':
+            query = f'SELECT date_trunc(\'day\', "date") AS "date", {dimensions}, sum("rows") AS "rows", sum(engagements) AS engagements FROM cells GROUP BY ALL'
+        else:
+            query = f'SELECT "date", {dimensions}, "rows", engagements FROM cells'
+        return connection.execute(query).df(), whole_numbers is not False, tz
+
+    def aggregates(self, source):
+        return summarize_groups(self.group(source))
+
+BACKENDS = {'pandas': PandasBackend, 'duckdb': DuckDBBackend}
+
+def available_backends():
+    return [name for name, backend in BACKENDS.items() if backend.available]
+
+def get_backend(name='pandas', **options):
+    # options go to the backend's constructor (DuckDB: threads, memory_limit, temp_directory)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'; choose one of {', '.join(BACKENDS)}")
+    if not BACKENDS[name].available:
+        raise ValueError(f"The {name} backend needs the {name} package (pip install {name})")
+    return BACKENDS[name](**options)
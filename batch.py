@@ -0,0 +1,180 @@
+# Headless batch mode: runs the dashboard pipeline over many CSV exports in parallel and writes the results to disk.
+#
+#   python batch.py exports/ "archive/2024-*.csv" --output-dir reports --workers 8
+#   python batch.py huge-export.csv --workers 1 --parse-workers 16
+#   python batch.py "archive/*.csv" --backend duckdb
+#
+# Each input gets <output-dir>/<name>/report.json (aggregates + insights) and one chart file per dashboard chart.
+# <output-dir>/summary.json lists every file with its status plus combined totals. The exit code is 1 when any
+# file failed, so schedulers can alert on partial failures.
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from backends import BACKENDS, available_backends, get_backend
+from pipeline import (
+    DEFAULT_CHUNK_ROWS, aggregates_to_dict, build_dashboard_figures, compute_dashboard_aggregates,
+    generate_insights, read_media_csv, read_media_csv_parallel, stream_grouped_media_data, summarize_groups,
+)
+
+# Chart formats other than HTML are rendered by Plotly through the optional kaleido package
+STATIC_CHART_FORMATS = ('png', 'svg', 'pdf')
+
+def find_csv_files(inputs):
+    # Expand directories (their *.csv files) and glob patterns into a sorted, de-duplicated list of paths
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(glob.glob(os.path.join(item, '*.csv')))
+        else:
+            paths.update(path for path in glob.glob(item) if os.path.isfile(path))
+    return sorted(paths)
+
+def assign_output_dirs(paths, output_dir):
+    # One output directory per input, named after the file; duplicate names get a numeric suffix
+    assigned = {}
+    used = set()
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        candidate, suffix = name, 2
+        while candidate in used:
+            candidate, suffix = f"{name}-{suffix}", suffix + 1
+        used.add(candidate)
+        assigned[path] = os.path.join(output_dir, candidate)
+    return assigned
+
+def process_file(path, output_dir, chart_format, chunk_rows, parse_workers=1, backend_name='pandas'):
+    # Runs in a worker process. Never raises: failures are reported in the returned record instead.
+    started = time.perf_counter()
+    record = {'file': path, 'output_dir': output_dir}
+    try:
+        if backend_name != 'pandas':
+            # The engine cleans and groups the file itself; the full table is never loaded into pandas
+            aggregates = get_backend(backend_name).aggregates(path)
+            aggregates = aggregates if aggregates.row_count > 0 else None
+        elif chunk_rows:
+            groups = stream_grouped_media_data(path, chunk_rows)
+            aggregates = summarize_groups(groups) if groups is not None and groups['rows'].sum() > 0 else None
+        else:
+            if parse_workers > 1:
+                # Each file worker gets its own pool, so a few huge files can still use every core
+                with ProcessPoolExecutor(max_workers=parse_workers) as parse_pool:
+                    df = read_media_csv_parallel(path, parse_pool, parse_workers)
+            else:
+                df = read_media_csv(path)
+            aggregates = compute_dashboard_aggregates(df) if not df.empty else None
+        if aggregates is None:
+            raise ValueError("no rows with a valid date")
+
+        os.makedirs(output_dir, exist_ok=True)
+        report = {'file': path, 'aggregates': aggregates_to_dict(aggregates), 'insights': generate_insights(aggregates)}
+        with open(os.path.join(output_dir, 'report.json'), 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+        if chart_format != 'none':
+            for name, fig in build_dashboard_figures(aggregates).items():
+                chart_path = os.path.join(output_dir, f"{name}.{chart_format}")
+                if chart_format == 'html':
+                    fig.write_html(chart_path, include_plotlyjs='cdn')
+                else:
+                    fig.write_image(chart_path)
+
+        record.update(
+            status='ok',
+            rows=aggregates.row_count,
+            engagements=float(aggregates.daily_engagements.sum()),
+            sentiment_counts=report['aggregates']['sentiment_counts'],
+            platform_engagements=report['aggregates']['platform_engagements'],
+            media_type_counts=report['aggregates']['media_type_counts'],
+        )
+    except Exception as e:
+        record.update(status='failed', error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    record['seconds'] = round(time.perf_counter() - started, 3)
+    return record
+
+def summarize_records(records):
+    # Combined totals across the successfully processed files
+    succeeded = [record for record in records if record['status'] == 'ok']
+
+    def combined(field):
+        totals = {}
+        for record in succeeded:
+            for key, value in record[field].items():
+                totals[key] = totals.get(key, 0) + value
+        return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+    return {
+        'files': len(records),
+        'succeeded': len(succeeded),
+        'failed': len(records) - len(succeeded),
+        'rows': sum(record['rows'] for record in succeeded),
+        'engagements': sum(record['engagements'] for record in succeeded),
+        'sentiment_counts': combined('sentiment_counts'),
+        'platform_engagements': combined('platform_engagements'),
+        'media_type_counts': combined('media_type_counts'),
+        'results': sorted(records, key=lambda record: record['file']),
+    }
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run the media intelligence dashboard analysis over many CSV exports.")
+    parser.add_argument('inputs', nargs='+', help="CSV files, directories containing CSV files, or glob patterns")
+    parser.add_argument('-o', '--output-dir', default='reports', help="where per-file reports and summary.json are written (default: reports)")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="worker processes (default: one per CPU core)")
+    parser.add_argument('--charts', choices=('html', 'none') + STATIC_CHART_FORMATS, default='html',
+                        help="chart output format; png/svg/pdf need the kaleido package (default: html)")
+    parser.add_argument('--chunk-rows', type=int, nargs='?', const=DEFAULT_CHUNK_ROWS, default=None,
+                        help=f"stream each CSV in chunks of this many rows to bound memory (default when given: {DEFAULT_CHUNK_ROWS:,})")
+    parser.add_argument('--backend', choices=list(BACKENDS), default='pandas',
+                        help="engine that parses, cleans and groups each file; duckdb needs the duckdb package (default: pandas)")
+    parser.add_argument('--parse-workers', type=int, default=1,
+                        help="processes parsing each CSV in parallel byte ranges; useful for a few very large files (default: 1)")
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.parse_workers < 1:
+        parser.error("--workers and --parse-workers must be at least 1")
+    if args.chunk_rows and args.parse_workers > 1:
+        parser.error("--chunk-rows and --parse-workers cannot be combined")
+    if args.backend not in available_backends():
+        parser.error(f"--backend {args.backend} needs the {args.backend} package (pip install {args.backend})")
+    if args.backend != 'pandas' and (args.chunk_rows or args.parse_workers > 1):
+        parser.error("--chunk-rows and --parse-workers only apply to the pandas backend")
+    if args.charts in STATIC_CHART_FORMATS and importlib.util.find_spec('kaleido') is None:
+        parser.error(f"--charts {args.charts} needs the kaleido package (pip install kaleido); use --charts html instead")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = find_csv_files(args.inputs)
+    if not paths:
+        print("No CSV files matched the given inputs.", file=sys.stderr)
+        return 1
+    output_dirs = assign_output_dirs(paths, args.output_dir)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    records = []
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(paths))) as executor:
+        futures = {executor.submit(process_file, path, output_dirs[path], args.charts, args.chunk_rows, args.parse_workers, args.backend): path for path in paths}
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                record = future.result()
+            except Exception as e: # The worker itself died, e.g. killed for running out of memory
+                record = {'file': path, 'output_dir': output_dirs[path], 'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+            records.append(record)
+            detail = f"{record['rows']:,} rows" if record['status'] == 'ok' else record['error']
+            print(f"[{done}/{len(paths)}] {record['status']:<6} {path} ({detail})", file=sys.stderr)
+
+    summary = summarize_records(records)
+    with open(os.path.join(args.output_dir, 'summary.json'), 'w') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    print(f"{summary['succeeded']} of {summary['files']} files processed; summary written to "
+          f"{os.path.join(args.output_dir, 'summary.json')}", file=sys.stderr)
+    return 1 if summary['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,389 @@
+# Benchmark harness for the dashboard pipeline: times and memory-profiles every stage on a CSV export.
+#
+#   python benchmark.py generate bench.csv --rows 1000000 --days 365 --locations 200
+#   python benchmark.py run bench.csv --repeat 5 --output results.json
+#   python benchmark.py run --rows 1000000 --baseline results.json --threshold 0.25
+#   python benchmark.py equivalence --rows 200000
+#
+# `run` without a CSV generates a synthetic one first (same options as `generate`). Results are JSON: the median
+# wall time of each stage over --repeat runs plus its peak traced allocation, measured in a separate run so that
+# tracemalloc overhead never skews the timings. With --baseline the exit code is 1 when any stage got slower or
+# used more memory than the baseline by more than --threshold.
+#
+# `equivalence` runs every installed backend (see backends.py) over the same export and exits 1 unless the
+# cleaned rows, chart aggregates, figures and insight text all match the pandas backend.
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from backends import BACKENDS, available_backends, get_backend
+from pipeline import (
+    apply_schema, build_location_figure, build_media_type_figure, build_platform_figure, build_sentiment_figure,
+    aggregates_to_dict, build_dashboard_figures, build_trend_figure, DashboardAggregates, generate_insights, group_media_data, grouping_frequency,
+    normalize_columns, parse_dates, prepare_trend_series, summarize_locations, summarize_media_types,
+    summarize_platforms, summarize_sentiment, summarize_trend,
+)
+
+# Bump when stages are added, removed or renamed so old baselines are recognisably different
+BENCHMARK_VERSION = 1
+
+# --- Synthetic Data ---
+# Category names for the generated columns; larger cardinalities are padded with numbered names
+PLATFORM_NAMES = ['Twitter', 'Facebook', 'Instagram', 'TikTok', 'News', 'YouTube', 'Reddit', 'LinkedIn']
+SENTIMENT_NAMES = ['Positive', 'Negative', 'Neutral', 'Mixed']
+MEDIA_TYPE_NAMES = ['Text', 'Image', 'Video', 'Link', 'Audio']
+# Rows are written in blocks of this size to keep the generator's memory flat for large files
+GENERATOR_BLOCK_ROWS = 500_000
+
+def category_names(names, count, prefix):
+    return (names + [f"{prefix} {i}" for i in range(len(names) + 1, count + 1)])[:count]
+
+def generate_media_csv(path, rows, start='2023-01-01', days=365, platforms=5, sentiments=3, media_types=4,
+                       locations=50, bad_date_pct=2.0, missing_engagement_pct=5.0, seed=0):
+    # Writes a CSV with the columns the dashboard expects. Dates are minute-resolution timestamps spread
+    # uniformly over `days`; bad dates and missing engagements are sprinkled in at the given percentages.
+    # Location popularity is skewed (Zipf-like), which is closer to real exports than a uniform draw.
+    rng = np.random.default_rng(seed)
+    platform_values = np.array(category_names(PLATFORM_NAMES, platforms, 'Platform'), dtype=object)
+    sentiment_values = np.array(category_names(SENTIMENT_NAMES, sentiments, 'Sentiment'), dtype=object)
+    media_type_values = np.array(category_names(MEDIA_TYPE_NAMES, media_types, 'Media'), dtype=object)
+    location_values = np.array([f"City {i}" for i in range(1, locations + 1)], dtype=object)
+    location_weights = 1.0 / np.arange(1, locations + 1)
+    location_weights /= location_weights.sum()
+    first_minute = np.datetime64(start, 'm')
+
+    with open(path, 'w', newline='') as csv_file:
+        for block_start in range(0, rows, GENERATOR_BLOCK_ROWS):
+            n = min(GENERATOR_BLOCK_ROWS, rows - block_start)
+            minutes = first_minute + rng.integers(0, days * 24 * 60, n).astype('timedelta64[m]')
+            dates = np.datetime_as_string(minutes).astype(object)
+            dates[rng.random(n) < bad_date_pct / 100] = 'not a date'
+            engagements = rng.lognormal(4, 1.5, n).round()
+            engagements[rng.random(n) < missing_engagement_pct / 100] = np.nan
+            block = pd.DataFrame({
+                'Date': dates,
+                'Platform': platform_values[rng.integers(0, platforms, n)],
+                'Sentiment': sentiment_values[rng.integers(0, sentiments, n)],
+                'Location': location_values[rng.choice(locations, n, p=location_weights)],
+                'Engagements': engagements,
+                'Media Type': media_type_values[rng.integers(0, media_types, n)],
+            })
+            block.to_csv(csv_file, index=False, header=block_start == 0)
+
+# --- Pipeline Stages ---
+def run_pipeline_stages(csv_path, measure):
+    # The dashboard pipeline split into its individual stages. measure(name, function, *args) runs one stage
+    # and returns its result, so the same sequence serves both the timing and the memory runs.
+    raw_df = measure('csv_read', pd.read_csv, csv_path)
+    raw_rows = len(raw_df) # Cleaning drops invalid dates from raw_df in place
+    df = measure('normalize_columns', normalize_columns, raw_df)
+    df = measure('date_parse', parse_dates, df)
+    df = measure('apply_schema', apply_schema, df)
+
+    groups = measure('aggregate.group', group_media_data, df, grouping_frequency(df['date']))
+    sentiment_counts = measure('aggregate.sentiment', summarize_sentiment, groups)
+    trend, trend_frequency, daily, daily_platform = measure('aggregate.trend', summarize_trend, groups)
+    platform_engagements = measure('aggregate.platform', summarize_platforms, groups)
+    media_type_counts = measure('aggregate.media_type', summarize_media_types, groups)
+    top_locations = measure('aggregate.location', summarize_locations, groups)
+    aggregates = DashboardAggregates(
+        row_count=int(groups['rows'].sum()),
+        sentiment_counts=sentiment_counts,
+        trend_engagements=trend,
+        trend_frequency=trend_frequency,
+        daily_engagements=daily,
+        daily_platform_engagements=daily_platform,
+        platform_engagements=platform_engagements,
+        media_type_counts=media_type_counts,
+        top_locations=top_locations,
+    )
+
+    measure('figure.sentiment', build_sentiment_figure, aggregates)
+    trend_series, _ = measure('figure.trend_downsample', prepare_trend_series, trend, trend_frequency, trend_frequency)
+    measure('figure.trend', build_trend_figure, trend_series)
+    measure('figure.platform', build_platform_figure, aggregates)
+    measure('figure.media_type', build_media_type_figure, aggregates)
+    measure('figure.location', build_location_figure, aggregates)
+    measure('insights', generate_insights, aggregates)
+    return {'raw_rows': raw_rows, 'clean_rows': len(df), 'group_rows': len(groups)}
+
+def time_stages(csv_path, repeat):
+    # Wall time of every stage over `repeat` full pipeline runs
+    seconds = {}
+
+    def measure(name, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        seconds.setdefault(name, []).append(time.perf_counter() - started)
+        return result
+
+    for _ in range(repeat):
+        counts = run_pipeline_stages(csv_path, measure)
+    return seconds, counts
+
+def trace_stage_memory(csv_path):
+    # Peak bytes allocated (through Python and NumPy allocators) while each stage runs, above what was
+    # already allocated when it started
+    peaks = {}
+
+    def measure(name, function, *args):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        result = function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[name] = peak - before
+        return result
+
+    tracemalloc.start()
+    try:
+        run_pipeline_stages(csv_path, measure)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def run_benchmark(csv_path, repeat):
+    seconds, counts = time_stages(csv_path, repeat)
+    peaks = trace_stage_memory(csv_path)
+    stages = {
+        name: {
+            'seconds': statistics.median(runs),
+            'seconds_min': min(runs),
+            'seconds_max': max(runs),
+            'peak_bytes': peaks[name],
+        }
+        for name, runs in seconds.items()
+    }
+    return {
+        'benchmark_version': BENCHMARK_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plotly': plotly.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'dataset': {'file': os.path.basename(csv_path), 'bytes': os.path.getsize(csv_path), **counts},
+        'repeat': repeat,
+        'total_seconds': sum(stage['seconds'] for stage in stages.values()),
+        'stages': stages,
+    }
+
+# --- Backend Equivalence ---
+# Engines add floating-point engagements in different orders, so sums may differ in the last few bits
+EQUIVALENCE_REL_TOLERANCE = 1e-9
+
+def dashboard_outputs(backend, csv_path):
+    # Everything the dashboard shows for one export, as JSON-like values
+    df = backend.clean(csv_path)
+    aggregates = backend.aggregates(csv_path)
+    return {
+        'cleaned': df,
+        'aggregates': aggregates_to_dict(aggregates),
+        'figures': {name: json.loads(fig.to_json()) for name, fig in build_dashboard_figures(aggregates).items()},
+        'insights': generate_insights(aggregates),
+    }
+
+def find_differences(expected, actual, path):
+    # Paths at which two JSON-like values differ; numbers only need to agree to EQUIVALENCE_REL_TOLERANCE
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        if expected.keys() != actual.keys():
+            return [f"{path}: keys {sorted(map(str, expected))} vs {sorted(map(str, actual))}"]
+        return [difference for key in expected for difference in find_differences(expected[key], actual[key], f"{path}.{key}")]
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return [f"{path}: {len(expected)} vs {len(actual)} items"]
+        return [difference for index, (left, right) in enumerate(zip(expected, actual))
+                for difference in find_differences(left, right, f"{path}[{index}]")]
+    numbers = (int, float)
+    if isinstance(expected, numbers) and isinstance(actual, numbers) and not isinstance(expected, bool):
+        if math.isclose(expected, actual, rel_tol=EQUIVALENCE_REL_TOLERANCE):
+            return []
+    elif expected == actual:
+        return []
+    return [f"{path}: {expected!r} vs {actual!r}"]
+
+def check_backend_equivalence(csv_path, backend_names):
+    # Differences of every other backend from pandas, keyed by backend name (an empty list means identical)
+    reference = dashboard_outputs(get_backend('pandas'), csv_path)
+    differences = {}
+    for name in backend_names:
+        if name == 'pandas':
+            continue
+        outputs = dashboard_outputs(get_backend(name), csv_path)
+        try:
+            pd.testing.assert_frame_equal(reference['cleaned'], outputs['cleaned'], check_exact=False, rtol=EQUIVALENCE_REL_TOLERANCE)
+            found = []
+        except AssertionError as e:
+            found = [f"cleaned frame: {' '.join(str(e).split())}"]
+        for part in ('aggregates', 'figures', 'insights'):
+            found += find_differences(reference[part], outputs[part], part)
+        differences[name] = found
+    return differences
+
+# --- Baseline Comparison ---
+def compare_to_baseline(results, baseline, threshold, min_seconds, min_bytes):
+    # Stages that got slower, or allocated more, than the baseline by more than `threshold` (a fraction).
+    # Differences under min_seconds / min_bytes are ignored: sub-millisecond stages are mostly timer noise.
+    regressions = []
+    for name, stage in results['stages'].items():
+        base = baseline['stages'].get(name)
+        if base is None:
+            continue # New stage, nothing to compare against
+        for metric, floor in (('seconds', min_seconds), ('peak_bytes', min_bytes)):
+            current, previous = stage[metric], base[metric]
+            if current - previous > floor and current > previous * (1 + threshold):
+                regressions.append({'stage': name, 'metric': metric, 'baseline': previous, 'current': current,
+                                    'change': current / previous - 1 if previous else None})
+    return regressions
+
+def format_report(results, baseline=None):
+    # Human-readable stage table for stderr
+    lines = [f"{'stage':<24} {'median':>10} {'min':>10} {'peak MB':>9}" + ('  vs baseline' if baseline else '')]
+    for name, stage in results['stages'].items():
+        line = f"{name:<24} {stage['seconds'] * 1000:>8.1f}ms {stage['seconds_min'] * 1000:>8.1f}ms {stage['peak_bytes'] / 2**20:>9.1f}"
+        base = (baseline or {}).get('stages', {}).get(name)
+        if base and base['seconds']:
+            line += f"  {stage['seconds'] / base['seconds'] - 1:+.0%}"
+        lines.append(line)
+    lines.append(f"{'total':<24} {results['total_seconds'] * 1000:>8.1f}ms")
+    return '\n'.join(lines)
+
+# --- Command Line ---
+def add_generator_arguments(parser):
+    parser.add_argument('--rows', type=int, default=1_000_000, help="rows to generate (default: 1,000,000)")
+    parser.add_argument('--start', default='2023-01-01', help="first date (default: 2023-01-01)")
+    parser.add_argument('--days', type=int, default=365, help="date span in days (default: 365)")
+    parser.add_argument('--platforms', type=int, default=5, help="distinct platforms (default: 5)")
+    parser.add_argument('--sentiments', type=int, default=3, help="distinct sentiments (default: 3)")
+    parser.add_argument('--media-types', type=int, default=4, help="distinct media types (default: 4)")
+    parser.add_argument('--locations', type=int, default=50, help="distinct locations (default: 50)")
+    parser.add_argument('--bad-date-pct', type=float, default=2.0, help="percentage of unparseable dates (default: 2)")
+    parser.add_argument('--missing-engagement-pct', type=float, default=5.0, help="percentage of empty engagements (default: 5)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: 0)")
+
+def generator_options(args):
+    return {
+        'rows': args.rows, 'start': args.start, 'days': args.days, 'platforms': args.platforms,
+        'sentiments': args.sentiments, 'media_types': args.media_types, 'locations': args.locations,
+        'bad_date_pct': args.bad_date_pct, 'missing_engagement_pct': args.missing_engagement_pct, 'seed': args.seed,
+    }
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the media intelligence dashboard pipeline.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="write a synthetic CSV export")
+    generate.add_argument('output', help="CSV file to write")
+    add_generator_arguments(generate)
+
+    run = commands.add_parser('run', help="time and memory-profile every pipeline stage")
+    run.add_argument('csv', nargs='?', help="CSV export to benchmark (default: generate one from the options below)")
+    run.add_argument('-r', '--repeat', type=int, default=3, help="timed runs per stage; the median is reported (default: 3)")
+    run.add_argument('-o', '--output', help="write the JSON results here instead of stdout")
+    run.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    run.add_argument('--threshold', type=float, default=0.2, help="allowed slowdown or memory growth per stage, as a fraction (default: 0.2)")
+    run.add_argument('--min-seconds', type=float, default=0.005, help="ignore time differences below this (default: 0.005)")
+    run.add_argument('--min-bytes', type=int, default=2**20, help="ignore memory differences below this (default: 1 MiB)")
+    add_generator_arguments(run)
+
+    equivalence = commands.add_parser('equivalence', help="check that every backend produces the same dashboard as pandas")
+    equivalence.add_argument('csv', nargs='?', help="CSV export to check (default: generate one from the options below)")
+    equivalence.add_argument('--backends', nargs='+', choices=list(BACKENDS), help="backends to compare with pandas (default: every installed one)")
+    add_generator_arguments(equivalence)
+
+    args = parser.parse_args(argv)
+    if args.rows < 1 or args.days < 1:
+        parser.error("--rows and --days must be at least 1")
+    if args.command == 'run' and args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    if args.command == 'equivalence':
+        missing = [name for name in args.backends or [] if name not in available_backends()]
+        if missing:
+            parser.error(f"backend not installed: {', '.join(missing)} (pip install {' '.join(missing)})")
+    return args
+
+def run_equivalence(args):
+    backend_names = [name for name in args.backends or available_backends() if name != 'pandas']
+    if not backend_names:
+        # Nothing was compared, which must not read as a pass in CI
+        print("Only the pandas backend is installed; install duckdb to compare backends.", file=sys.stderr)
+        return 2
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        csv_path = args.csv
+        if csv_path is None:
+            csv_path = os.path.join(scratch_dir, 'synthetic.csv')
+            print(f"Generating {args.rows:,} synthetic rows...", file=sys.stderr)
+            generate_media_csv(csv_path, **generator_options(args))
+        differences = check_backend_equivalence(csv_path, backend_names)
+    for name, found in differences.items():
+        print(f"{name}: {'same output as pandas' if not found else f'{len(found)} differences from pandas'}", file=sys.stderr)
+        for difference in found[:20]:
+            print(f"  {difference[:300]}", file=sys.stderr)
+    return 1 if any(differences.values()) else 0
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'generate':
+        started = time.perf_counter()
+        generate_media_csv(args.output, **generator_options(args))
+        print(f"Wrote {args.rows:,} rows to {args.output} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        return 0
+    if args.command == 'equivalence':
+        return run_equivalence(args)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('benchmark_version') != BENCHMARK_VERSION:
+            print(f"Baseline was written by benchmark version {baseline.get('benchmark_version')}, "
+                  f"this is version {BENCHMARK_VERSION}; stages may not line up.", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        csv_path = args.csv
+        if csv_path is None:
+            csv_path = os.path.join(scratch_dir, 'synthetic.csv')
+            print(f"Generating {args.rows:,} synthetic rows...", file=sys.stderr)
+            generate_media_csv(csv_path, **generator_options(args))
+        results = run_benchmark(csv_path, args.repeat)
+        if args.csv is None:
+            results['dataset']['generator'] = generator_options(args)
+
+    print(format_report(results, baseline), file=sys.stderr)
+    if baseline is not None:
+        results['baseline'] = {
+            'file': args.baseline,
+            'threshold': args.threshold,
+            'regressions': compare_to_baseline(results, baseline, args.threshold, args.min_seconds, args.min_bytes),
+        }
+        if baseline.get('dataset', {}).get('raw_rows') != results['dataset']['raw_rows']:
+            print("Warning: the baseline was measured on a different number of rows.", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+    regressions = results.get('baseline', {}).get('regressions', [])
+    for regression in regressions:
+        print(f"REGRESSION {regression['stage']} {regression['metric']}: {regression['baseline']:,.4g} -> "
+              f"{regression['current']:,.4g}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,469 @@
+# Precomputed indexes over a cleaned dataset, so the dashboard filters can be answered without rescanning
+# or re-grouping the full frame on every widget change.
+import numpy as np
+import pandas as pd
+
+from pipeline import DIMENSION_COLUMNS, TOP_LOCATIONS, DashboardAggregates, choose_trend_frequency
+
+# A category's row-position list is used while the selected categories cover less than this share of the
+# date window; past that, a lookup over the window's category codes is cheaper than scattering positions
+POSTINGS_SELECTIVITY = 0.125
+
+# Per-day tables for one dimension are kept while they stay under this many cells; whole-day selections on a
+# dimension without tables (or on several dimensions at once) are added up from the cell cube instead
+DAY_TABLE_MAX_CELLS = 1 << 23
+
+class FilterIndex:
+    # Rows are stored in date order, so any date range is one contiguous slice found by binary search.
+    # Each dimension keeps a per-row category slot (0 = missing value, n = the n-th category) and, per slot,
+    # the sorted positions of its rows. Everything aggregate() needs is also pre-summed per (day, slot) of each
+    # dimension, so a date range of whole days (what the date picker selects) filtered on at most one dimension
+    # only adds up table cells; whole days filtered on several dimensions add up cells of a sparse cube of
+    # (location, platform x sentiment x media type, time bucket) sums. Only windows that cut through a day use
+    # np.bincount calls over the selected rows' slots.
+    def __init__(self, df):
+        # Timezone-aware dates are indexed by their local wall-clock time, so days and hours fall where the
+        # unfiltered charts put them; the timezone is put back on every date handed out
+        dates = df['date']
+        self.tz = dates.dt.tz
+        if self.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        dates = dates.to_numpy()
+        order = np.argsort(dates, kind='stable')
+        self.dates = dates[order]
+        self.engagements = df['engagements'].to_numpy()[order]
+        days = self.dates.astype('datetime64[D]')
+        self.day_codes = (days - days[0]).astype(np.int32)
+        # Same hourly/daily choice as summarize_trend, so filtered trends keep their resolution: hourly only for a
+        # short span with some time of day other than midnight
+        start, end = pd.Timestamp(self.dates[0]), pd.Timestamp(self.dates[-1])
+        has_times = bool((self.dates != days).any())
+        self.trend_frequency = 'h' if has_times and choose_trend_frequency(start, end) == 'h' else 'D'
+        if self.trend_frequency == 'h':
+            hours = self.dates.astype('datetime64[h]')
+            self.bucket_codes = (hours - hours[0]).astype(np.int32)
+        else:
+            self.bucket_codes = self.day_codes
+        position_dtype = np.int32 if len(order) < np.iinfo(np.int32).max else np.int64
+        self.categories = {}
+        self.slots = {}
+        self.postings = {}
+        for column in DIMENSION_COLUMNS:
+            values = df[column].astype('category')
+            self.categories[column] = values.cat.categories
+            # Smallest unsigned type that holds every slot; low-cardinality columns take one byte per row
+            slot_dtype = np.min_scalar_type(len(self.categories[column]))
+            slots = (values.cat.codes.to_numpy().astype(np.int32) + 1).astype(slot_dtype)[order]
+            self.slots[column] = slots
+            # Stable argsort groups row positions by slot while keeping them ascending within each slot
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(slots, minlength=len(self.categories[column]) + 1))])
+            self.postings[column] = (np.argsort(slots, kind='stable').astype(position_dtype), offsets)
+        self.widths = {column: len(self.categories[column]) + 1 for column in DIMENSION_COLUMNS}
+        self.day_tables = self._build_day_tables()
+        self.cube = self._build_cube()
+
+    def _output_slots(self):
+        # The per-row slots each pre-summed output is keyed by: (slots, width, summed engagements or row counts)
+        media_width = self.widths['mediatype']
+        return {
+            'platform_sums': (self.slots['platform'], self.widths['platform'], True),
+            'platform_counts': (self.slots['platform'], self.widths['platform'], False),
+            'location_sums': (self.slots['location'], self.widths['location'], True),
+            'location_counts': (self.slots['location'], self.widths['location'], False),
+            # Sentiment and media type counts share one combined slot
+            'sentiment_media': (self.slots['sentiment'].astype(np.int64) * media_width + self.slots['mediatype'],
+                                self.widths['sentiment'] * media_width, False),
+        }
+
+    def _output_values(self, name, column):
+        # The value of `column` behind each slot of an output keyed by that column itself, else None
+        media_width = self.widths['mediatype']
+        if name == 'sentiment_media' and column in ('sentiment', 'mediatype'):
+            combined = np.arange(self.widths['sentiment'] * media_width)
+            return combined // media_width if column == 'sentiment' else combined % media_width
+        if name.startswith(column + '_'):
+            return np.arange(self.widths[column])
+        return None
+
+    def _build_day_tables(self):
+        # Each output summed per (day, slot) of each dimension (and per day alone, for date-only selections),
+        # as a days x slots x output slots table; hourly trends also get an hours x slots table. An output keyed
+        # by the dimension itself is read from the date-only tables instead. Tables are summed over the selected
+        # days and slots rather than kept as running totals, so float engagements do not lose precision to the
+        # subtraction of two large prefix sums.
+        day_count = int(self.day_codes[-1]) + 1
+        day_offsets = self.day_codes.astype(np.int64)
+        hour_count = int(self.bucket_codes[-1]) + 1
+        outputs = self._output_slots()
+        tables = {'day_starts': np.searchsorted(self.day_codes, np.arange(day_count + 1))} # First row of each day
+        for column in [None] + DIMENSION_COLUMNS:
+            width = 1 if column is None else self.widths[column]
+            names = [name for name in outputs if column is None or self._output_values(name, column) is None]
+            if day_count * width * sum(outputs[name][1] for name in names) > DAY_TABLE_MAX_CELLS:
+                if column is None:
+                    break # The dimension tables read some outputs from the date-only ones
+                continue
+            keys = day_offsets * width if column is None else day_offsets * width + self.slots[column]
+            column_tables = {}
+            for name in names:
+                slots, output_width, summed = outputs[name]
+                table = np.bincount(keys * output_width + slots, weights=self.engagements if summed else None,
+                                    minlength=day_count * width * output_width).reshape(day_count, width, output_width)
+                column_tables[name] = table if summed else table.astype(np.int32) # Counts per cell fit in 32 bits
+            if self.trend_frequency == 'h':
+                hour_keys = self.bucket_codes.astype(np.int64) * width + (0 if column is None else self.slots[column])
+                column_tables['hour_sums'] = np.bincount(hour_keys, weights=self.engagements, minlength=hour_count * width).reshape(hour_count, width)
+                column_tables['hour_counts'] = np.bincount(hour_keys, minlength=hour_count * width).reshape(hour_count, width).astype(np.int32)
+            tables[column] = column_tables
+        # Row counts and engagement sums per (day, platform x sentiment x media type), which answer every output
+        # but the locations for selections on several of those three dimensions
+        combined_width = self.widths['platform'] * self.widths['sentiment'] * self.widths['mediatype']
+        if None in tables and 2 * day_count * combined_width <= DAY_TABLE_MAX_CELLS:
+            combined = self._combined_slots()
+            keys = day_offsets * combined_width + combined
+            tables['combined'] = {
+                'sums': np.bincount(keys, weights=self.engagements, minlength=day_count * combined_width).reshape(day_count, combined_width),
+                'counts': np.bincount(keys, minlength=day_count * combined_width).reshape(day_count, combined_width).astype(np.int32),
+            }
+            if self.trend_frequency == 'h':
+                hour_keys = self.bucket_codes.astype(np.int64) * combined_width + combined
+                tables['combined']['hour_sums'] = np.bincount(hour_keys, weights=self.engagements, minlength=hour_count * combined_width).reshape(hour_count, combined_width)
+                tables['combined']['hour_counts'] = np.bincount(hour_keys, minlength=hour_count * combined_width).reshape(hour_count, combined_width).astype(np.int32)
+        return tables
+
+    def _combined_slots(self):
+        # One slot per (platform, sentiment, media type) combination
+        combined = self.slots['platform'].astype(np.int64) * self.widths['sentiment'] + self.slots['sentiment']
+        return combined * self.widths['mediatype'] + self.slots['mediatype']
+
+    def _build_cube(self):
+        # Rows grouped into (location, platform x sentiment x media type, time bucket) cells with their row counts and
+        # engagement sums, sorted by that key: the cells of any combination of selected categories within a date
+        # window are then a few contiguous runs, found by binary search
+        combined_width = self.widths['platform'] * self.widths['sentiment'] * self.widths['mediatype']
+        bucket_count = int(self.bucket_codes[-1]) + 1
+        keys = (self.slots['location'].astype(np.int64) * combined_width + self._combined_slots()) * bucket_count + self.bucket_codes
+        keys, cell_of_row = np.unique(keys, return_inverse=True)
+        buckets = (keys % bucket_count).astype(np.int32)
+        combined = keys // bucket_count % combined_width
+        media_width = self.widths['mediatype']
+        sentiment_media_width = self.widths['sentiment'] * media_width
+        cube = {
+            'keys': keys,
+            'sums': np.bincount(cell_of_row, weights=self.engagements),
+            'counts': np.bincount(cell_of_row).astype(np.int32),
+            'buckets': buckets,
+            'platforms': (combined // sentiment_media_width).astype(self.slots['platform'].dtype),
+            'sentiment_media': (combined % sentiment_media_width).astype(np.min_scalar_type(sentiment_media_width)),
+            'locations': (keys // bucket_count // combined_width).astype(self.slots['location'].dtype),
+        }
+        if self.trend_frequency == 'h':
+            # Day of each hourly bucket, counted from the first day like day_codes
+            first_hour = self.dates[0].astype('datetime64[h]')
+            hours = first_hour + np.arange(bucket_count).astype('timedelta64[h]')
+            cube['days'] = (hours.astype('datetime64[D]') - first_hour.astype('datetime64[D]')).astype(np.int32)[buckets]
+        else:
+            cube['days'] = buckets
+        return cube
+
+    @property
+    def nbytes(self):
+        arrays = [self.dates, self.engagements, self.day_codes, self.bucket_codes]
+        arrays += list(self.slots.values()) + [array for posting in self.postings.values() for array in posting]
+        arrays += [self.day_tables['day_starts']]
+        arrays += [table for column in [None, 'combined'] + DIMENSION_COLUMNS for table in self.day_tables.get(column, {}).values()]
+        arrays += list({id(array): array for array in self.cube.values()}.values()) # 'days' may share 'buckets'
+        return sum(array.nbytes for array in arrays)
+
+    @property
+    def date_range(self):
+        return self._timestamp(self.dates[0]), self._timestamp(self.dates[-1])
+
+    def _timestamp(self, value):
+        return pd.Timestamp(value).tz_localize(self.tz)
+
+    def _position(self, bound):
+        # Bounds are compared in local wall-clock time: dates (as the date picker gives them) and naive
+        # timestamps as they are, timezone-aware timestamps after conversion to the dataset's timezone
+        bound = pd.Timestamp(bound)
+        if bound.tz is not None:
+            bound = bound.tz_convert(self.tz).tz_localize(None)
+        return int(np.searchsorted(self.dates, bound.to_datetime64(), 'left'))
+
+    def _window(self, start, end):
+        lo = 0 if start is None else self._position(start)
+        hi = len(self.dates) if end is None else self._position(end)
+        return lo, max(hi, lo)
+
+    def _selected_slots(self, selections):
+        # Slots selected per constrained dimension; nothing selected means no constraint on that dimension
+        selected = {}
+        for column, values in (selections or {}).items():
+            if values:
+                codes = self.categories[column].get_indexer(values)
+                selected[column] = codes[codes >= 0] + 1
+        return selected
+
+    def select(self, start=None, end=None, selections=None):
+        # Row positions matching the date range [start, end) and, per dimension, any of the selected values.
+        # Returns a slice when only the date range is constrained.
+        lo, hi = self._window(start, end)
+        return self._select_rows(lo, hi, self._selected_slots(selections))
+
+    def _select_rows(self, lo, hi, selected):
+        mask = None
+        for column, slots in selected.items():
+            column_mask = self._window_mask(column, slots, lo, hi)
+            mask = column_mask if mask is None else mask & column_mask
+        if mask is None:
+            return slice(lo, hi)
+        return lo + np.flatnonzero(mask)
+
+    def _window_mask(self, column, selected_slots, lo, hi):
+        positions_by_slot, offsets = self.postings[column]
+        window = hi - lo
+        if (offsets[selected_slots + 1] - offsets[selected_slots]).sum() < window * POSTINGS_SELECTIVITY:
+            mask = np.zeros(window, dtype=bool)
+            for slot in selected_slots:
+                positions = positions_by_slot[offsets[slot]:offsets[slot + 1]]
+                # Positions are sorted, so the rows inside the date window are one contiguous run
+                mask[positions[np.searchsorted(positions, lo):np.searchsorted(positions, hi)] - lo] = True
+            return mask
+        lookup = np.zeros(len(self.categories[column]) + 1, dtype=bool)
+        lookup[selected_slots] = True
+        return lookup[self.slots[column][lo:hi]]
+
+    @staticmethod
+    def _whole(counts):
+        # Row counts added up with bincount weights come back as float64
+        return np.rint(counts).astype(np.int64)
+
+    def _sums(self, values):
+        # bincount weights come back as float64; keep whole-number engagements as integers like groupby does
+        if self.engagements.dtype.kind in 'iu':
+            return np.rint(values).astype(np.int64)
+        return values
+
+    def _counts_by(self, column, counts):
+        counts = counts[1:] # Drop the missing-value slot, like value_counts()
+        present = counts > 0
+        series = pd.Series(counts[present], index=self.categories[column][present], name='rows')
+        series.index.name = column
+        return series.sort_values(ascending=False, kind='stable')
+
+    def _whole_days(self, lo, hi):
+        # (first day, last day) when the row window [lo, hi) starts and ends on day boundaries
+        if hi <= lo:
+            return None
+        day_starts = self.day_tables['day_starts']
+        first_day, last_day = int(self.day_codes[lo]), int(self.day_codes[hi - 1])
+        if day_starts[first_day] != lo or day_starts[last_day + 1] != hi:
+            return None
+        return first_day, last_day
+
+    def _table_sum(self, name, column, slots, rows):
+        # An output's table summed over the selected slots of `column` (all of them for None), for the table rows
+        # (days or hours) given
+        tables = self.day_tables[column]
+        if name not in tables:
+            # Keyed by the dimension itself: the date-only table with the unselected slots zeroed
+            table = self.day_tables[None][name][rows, 0]
+            return np.where(np.isin(self._output_values(name, column), slots), table, 0)
+        table = tables[name][rows]
+        return table[:, 0] if column is None else table[:, slots].sum(axis=1)
+
+    def _day_cells(self, first_day, last_day, column, slots):
+        # Sums and counts for whole days, read from the per-day tables without touching the rows. The range is
+        # trimmed to the days the selection has rows on, as the bincounts over rows would give.
+        days = slice(first_day, last_day + 1)
+        sentiment_media = self._table_sum('sentiment_media', column, slots, days)
+        rows_by_day = np.flatnonzero(sentiment_media.sum(axis=1))
+        if len(rows_by_day) == 0:
+            return None
+        days = slice(first_day + rows_by_day[0], first_day + rows_by_day[-1] + 1)
+        cells = {
+            'row_count': sentiment_media.sum(),
+            'first_day': days.start,
+            'day_platform': self._table_sum('platform_sums', column, slots, days),
+            'platform_counts': self._table_sum('platform_counts', column, slots, days).sum(axis=0),
+            'location_sums': self._table_sum('location_sums', column, slots, days).sum(axis=0),
+            'location_counts': self._table_sum('location_counts', column, slots, days).sum(axis=0),
+            'sentiment_media': sentiment_media.sum(axis=0).reshape(-1, self.widths['mediatype']),
+        }
+        if self.trend_frequency == 'h':
+            day_starts = self.day_tables['day_starts']
+            hours = slice(self.bucket_codes[day_starts[days.start]], self.bucket_codes[day_starts[days.stop] - 1] + 1)
+            hour_counts = self._table_sum('hour_counts', column, slots, hours)
+            rows_by_hour = np.flatnonzero(hour_counts)
+            hours = slice(hours.start + rows_by_hour[0], hours.start + rows_by_hour[-1] + 1)
+            cells['first_hour'] = hours.start
+            cells['hourly'] = self._table_sum('hour_sums', column, slots, hours)
+        return cells
+
+    def _combined_cells(self, first_day, last_day, combined):
+        # Every output but the locations for whole days and the selected (platform, sentiment, media type)
+        # combinations, from the combined per-day tables
+        tables = self.day_tables['combined']
+        counts = tables['counts'][first_day:last_day + 1, combined]
+        rows_by_day = np.flatnonzero(counts.sum(axis=1))
+        if len(rows_by_day) == 0:
+            return None
+        days = slice(first_day + rows_by_day[0], first_day + rows_by_day[-1] + 1)
+        counts = counts[rows_by_day[0]:rows_by_day[-1] + 1].sum(axis=0)
+        sentiment_media_width = self.widths['sentiment'] * self.widths['mediatype']
+        platforms = combined // sentiment_media_width
+        # Summing the selected columns of each platform is a product with a combination -> platform indicator
+        to_platform = np.zeros((len(combined), self.widths['platform']))
+        to_platform[np.arange(len(combined)), platforms] = 1
+        cells = {
+            'row_count': counts.sum(dtype=np.int64),
+            'first_day': days.start,
+            'day_platform': tables['sums'][days, combined] @ to_platform,
+            'platform_counts': np.bincount(platforms, weights=counts, minlength=self.widths['platform']),
+            'sentiment_media': self._whole(np.bincount(combined % sentiment_media_width, weights=counts,
+                                                       minlength=sentiment_media_width)).reshape(-1, self.widths['mediatype']),
+        }
+        if self.trend_frequency == 'h':
+            day_starts = self.day_tables['day_starts']
+            hours = slice(self.bucket_codes[day_starts[days.start]], self.bucket_codes[day_starts[days.stop] - 1] + 1)
+            rows_by_hour = np.flatnonzero(tables['hour_counts'][hours, combined].sum(axis=1))
+            hours = slice(hours.start + rows_by_hour[0], hours.start + rows_by_hour[-1] + 1)
+            cells['first_hour'] = hours.start
+            cells['hourly'] = tables['hour_sums'][hours, combined].sum(axis=1)
+        return cells
+
+    def _cube_cells(self, lo, hi, first_day, last_day, selected):
+        # Sums and counts for whole days and any selection, added up from the cube cells in the window. Without
+        # a location constraint only the location totals need the cells; the rest comes from the combined tables.
+        cube = self.cube
+        bucket_count = int(self.bucket_codes[-1]) + 1
+        allowed = {}
+        for column in DIMENSION_COLUMNS:
+            allowed[column] = np.ones(self.widths[column], dtype=bool)
+            if column in selected:
+                allowed[column][:] = False
+                allowed[column][selected[column]] = True
+        combined = np.flatnonzero(allowed['platform'][:, None, None] & allowed['sentiment'][None, :, None] & allowed['mediatype'][None, None, :])
+        combined_width = self.widths['platform'] * self.widths['sentiment'] * self.widths['mediatype']
+        pairs = (np.flatnonzero(allowed['location'])[:, None] * combined_width + combined[None, :]).ravel() * bucket_count
+        starts = np.searchsorted(cube['keys'], pairs + self.bucket_codes[lo])
+        lengths = np.searchsorted(cube['keys'], pairs + self.bucket_codes[hi - 1] + 1) - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return None
+        # Positions of every cell in the runs, without a Python loop over the runs
+        cells_index = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        sums, counts = cube['sums'][cells_index], cube['counts'][cells_index]
+        if 'location' not in selected and 'combined' in self.day_tables:
+            cells = self._combined_cells(first_day, last_day, combined)
+        else:
+            days, platforms = cube['days'][cells_index], cube['platforms'][cells_index]
+            first_day = days.min()
+            day_count = int(days.max() - first_day) + 1
+            platform_width = self.widths['platform']
+            day_platform = np.bincount((days - first_day).astype(np.int64) * platform_width + platforms,
+                                       weights=sums, minlength=day_count * platform_width).reshape(day_count, platform_width)
+            sentiment_media_width = self.widths['sentiment'] * self.widths['mediatype']
+            cells = {
+                'row_count': counts.sum(dtype=np.int64),
+                'first_day': first_day,
+                'day_platform': day_platform,
+                'platform_counts': np.bincount(platforms, weights=counts, minlength=platform_width),
+                'sentiment_media': self._whole(np.bincount(cube['sentiment_media'][cells_index], weights=counts,
+                                                           minlength=sentiment_media_width)).reshape(-1, self.widths['mediatype']),
+            }
+            if self.trend_frequency == 'h':
+                buckets = cube['buckets'][cells_index]
+                cells['first_hour'] = buckets.min()
+                cells['hourly'] = np.bincount(buckets - cells['first_hour'], weights=sums)
+        locations = cube['locations'][cells_index]
+        cells['location_sums'] = np.bincount(locations, weights=sums, minlength=self.widths['location'])
+        cells['location_counts'] = np.bincount(locations, weights=counts, minlength=self.widths['location'])
+        return cells
+
+    def _row_cells(self, rows):
+        # The same sums and counts from weighted bincounts over the selected rows
+        engagements = self.engagements[rows]
+        if len(engagements) == 0:
+            return None
+        day_codes = self.day_codes[rows]
+        first_day = day_codes[0] # Rows are in date order, so the first and last rows bound the range
+        day_count = int(day_codes[-1] - first_day) + 1
+
+        # One weighted bincount over (day, platform) yields the daily, per-platform and day x platform sums
+        platform_slots = self.slots['platform'][rows]
+        platform_width = self.widths['platform']
+        day_platform = np.bincount((day_codes - first_day).astype(np.int64) * platform_width + platform_slots,
+                                   weights=engagements, minlength=day_count * platform_width).reshape(day_count, platform_width)
+        cells = {
+            'row_count': len(engagements),
+            'first_day': first_day,
+            'day_platform': day_platform,
+            'platform_counts': np.bincount(platform_slots, minlength=platform_width),
+        }
+        if self.trend_frequency == 'h':
+            bucket_codes = self.bucket_codes[rows]
+            cells['first_hour'] = bucket_codes[0]
+            cells['hourly'] = np.bincount(bucket_codes - bucket_codes[0], weights=engagements)
+
+        # Sentiment and media type counts also share one bincount over the combined slot
+        media_width = self.widths['mediatype']
+        cells['sentiment_media'] = np.bincount(self.slots['sentiment'][rows].astype(np.intp) * media_width + self.slots['mediatype'][rows],
+                                               minlength=self.widths['sentiment'] * media_width).reshape(-1, media_width)
+
+        location_slots = self.slots['location'][rows]
+        cells['location_sums'] = np.bincount(location_slots, weights=engagements, minlength=self.widths['location'])
+        cells['location_counts'] = np.bincount(location_slots, minlength=self.widths['location'])
+        return cells
+
+    def aggregate(self, start=None, end=None, selections=None):
+        # DashboardAggregates for the rows in the date range [start, end) matching, per dimension, any of the
+        # selected values, or None when nothing matches
+        lo, hi = self._window(start, end)
+        selected = self._selected_slots(selections)
+        whole_days = self._whole_days(lo, hi)
+        column = next(iter(selected)) if len(selected) == 1 else None
+        if whole_days is not None and len(selected) <= 1 and column in self.day_tables:
+            cells = self._day_cells(*whole_days, column, selected.get(column))
+        elif whole_days is not None:
+            cells = self._cube_cells(lo, hi, *whole_days, selected)
+        else:
+            cells = self._row_cells(self._select_rows(lo, hi, selected))
+        if cells is None:
+            return None
+        first_day = pd.Timestamp(self.dates[0]).normalize() + pd.Timedelta(days=int(cells['first_day']))
+        day_platform = cells['day_platform']
+        days = pd.date_range(first_day, periods=len(day_platform), freq='D', tz=self.tz, name='date')
+
+        platform_present = cells['platform_counts'][1:] > 0
+        platforms = self.categories['platform'][platform_present]
+        daily = pd.Series(self._sums(day_platform.sum(axis=1)), index=days, name='engagements')
+        daily_platform = pd.DataFrame(self._sums(day_platform[:, 1:][:, platform_present]), index=days, columns=platforms)
+        platform_engagements = pd.Series(self._sums(day_platform[:, 1:].sum(axis=0)[platform_present]), index=platforms, name='engagements')
+        platform_engagements.index.name = 'platform'
+
+        if self.trend_frequency == 'h':
+            hourly = cells['hourly']
+            first_hour = pd.Timestamp(self.dates[0]).floor('h') + pd.Timedelta(hours=int(cells['first_hour']))
+            trend_index = pd.date_range(first_hour, periods=len(hourly), freq='h', tz=self.tz, name='date')
+            trend = pd.Series(self._sums(hourly), index=trend_index, name='engagements')
+        else:
+            trend = daily
+
+        location_present = cells['location_counts'][1:] > 0
+        location_engagements = pd.Series(self._sums(cells['location_sums'][1:][location_present]),
+                                          index=self.categories['location'][location_present], name='engagements')
+        location_engagements.index.name = 'location'
+
+        sentiment_media = cells['sentiment_media']
+        return DashboardAggregates(
+            row_count=int(cells['row_count']),
+            sentiment_counts=self._counts_by('sentiment', sentiment_media.sum(axis=1)),
+            trend_engagements=trend,
+            trend_frequency=self.trend_frequency,
+            daily_engagements=daily,
+            daily_platform_engagements=daily_platform,
+            platform_engagements=platform_engagements,
+            media_type_counts=self._counts_by('mediatype', sentiment_media.sum(axis=0)),
+            top_locations=location_engagements.nlargest(TOP_LOCATIONS),
+        )
@@ -0,0 +1,109 @@
+# Opt-in per-stage instrumentation: wall time, peak RSS growth and row counts for each named stage of a run.
+#
+# A StageRecorder is activated for the current thread (Streamlit runs every script rerun in its own thread);
+# code anywhere in the pipeline then wraps work in `with stage('csv_read') as fields: ... fields['rows'] = n`.
+# With no active recorder stage() only does a context-variable lookup, so instrumented code costs nothing
+# when instrumentation is off. Records export as JSON lines or as a Chrome trace (chrome://tracing, Perfetto).
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+try:
+    import resource # Unix only; RSS figures are left empty elsewhere
+except ImportError:
+    resource = None
+
+_active_recorder = ContextVar('active_recorder', default=None)
+# Appends to a shared JSONL log come from many sessions at once
+_log_lock = threading.Lock()
+
+def peak_rss_bytes():
+    # High-water mark of the process's resident set size, or None when the platform does not report it
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # Linux reports kilobytes, macOS bytes
+
+class StageRecorder:
+    # Collects one record per finished stage. rss_peak_delta_bytes is how far the stage pushed the process's
+    # peak RSS up; it stays 0 for stages that fit under an earlier peak, since the OS only tracks the maximum.
+    def __init__(self, session_id=None, run_id=None):
+        self.session_id = session_id
+        self.run_id = run_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.records = []
+        self._depth = 0
+
+    @contextmanager
+    def stage(self, name, **fields):
+        record = {'stage': name, 'depth': self._depth, **fields}
+        rss_before = peak_rss_bytes()
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            ended = time.perf_counter()
+            self._depth -= 1
+            rss_after = peak_rss_bytes()
+            record['start_seconds'] = started - self.started
+            record['seconds'] = ended - started
+            record['rss_peak_delta_bytes'] = None if rss_before is None else rss_after - rss_before
+            self.records.append(record)
+
+    def total_seconds(self):
+        return time.perf_counter() - self.started
+
+    def ordered_records(self):
+        # Records in start order; they are appended as stages finish, so nested stages come before their parent
+        return sorted(self.records, key=lambda record: (record['start_seconds'], record['depth']))
+
+    def to_json_lines(self):
+        # One JSON object per stage, self-describing enough to be collected across sessions
+        lines = []
+        for record in self.ordered_records():
+            line = {'timestamp': self.started_at + record['start_seconds'], 'session_id': self.session_id,
+                    'run_id': self.run_id, 'pid': os.getpid(), **record}
+            lines.append(json.dumps(line, default=str))
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def to_chrome_trace(self):
+        # Chrome trace event format: complete ('X') events with microsecond timestamps
+        events = []
+        for record in self.ordered_records():
+            args = {key: value for key, value in record.items() if key not in ('stage', 'depth', 'start_seconds', 'seconds')}
+            events.append({
+                'name': record['stage'], 'cat': 'dashboard', 'ph': 'X', 'pid': os.getpid(), 'tid': 1,
+                'ts': round((self.started_at + record['start_seconds']) * 1e6),
+                'dur': round(record['seconds'] * 1e6), 'args': args,
+            })
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms',
+                           'otherData': {'session_id': self.session_id, 'run_id': self.run_id}}, default=str)
+
+    def append_to_log(self, path):
+        # Ops collection: every instrumented run appends its stages to one shared JSONL file
+        lines = self.to_json_lines()
+        if not lines:
+            return
+        with _log_lock, open(path, 'a') as log_file:
+            log_file.write(lines)
+
+def activate_recorder(recorder):
+    # Make `recorder` (or None to switch instrumentation off) the target of stage() in the current context
+    _active_recorder.set(recorder)
+
+@contextmanager
+def stage(name, **fields):
+    # Record `name` on the active recorder, if any. The yielded dict takes extra fields such as 'rows'.
+    recorder = _active_recorder.get()
+    if recorder is None:
+        yield fields
+        return
+    with recorder.stage(name, **fields) as record:
+        yield record
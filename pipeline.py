@@ -0,0 +1,793 @@
+# Headless analysis pipeline behind the dashboard: CSV cleaning, chart aggregates, insight text and figures.
+# Nothing in here depends on Streamlit, so app.py and batch.py share exactly the same logic.
+from dataclasses import dataclass, field
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+from pandas.tseries.api import guess_datetime_format
+
+from perf import stage
+
+# --- Data Cleaning ---
+# Bump this whenever the cleaning steps below change so stale cache entries are never reused
+CLEANING_PIPELINE_VERSION = 3
+# Explicit dtypes for the cleaned frame: low-cardinality dimensions are stored as categoricals
+CATEGORICAL_SCHEMA = {'platform': 'category', 'sentiment': 'category', 'location': 'category', 'mediatype': 'category'}
+# Number of non-empty date strings sampled to pick the date format
+DATE_FORMAT_SAMPLE_SIZE = 100
+
+def normalize_columns(df):
+    # Normalize column names: strip whitespace, convert to lowercase, replace spaces with empty string
+    df.columns = df.columns.str.strip().str.lower().str.replace(' ', '')
+    return df
+
+def infer_date_format(dates):
+    # Guess a single strftime format from a sample so pd.to_datetime never falls back to per-row guessing.
+    # Only the head of the column is inspected; the most common guess wins. None means "let pandas decide".
+    sample = dates.iloc[:DATE_FORMAT_SAMPLE_SIZE * 10].dropna().astype(str).head(DATE_FORMAT_SAMPLE_SIZE)
+    guesses = sample.map(guess_datetime_format).dropna()
+    if guesses.empty:
+        return None
+    return guesses.mode().iloc[0]
+
+def narrow_engagements(engagements):
+    # Store whole-number engagements in the smallest integer type that holds them.
+    # Fractional values stay float64: float32 would silently change the chart totals.
+    values = engagements.to_numpy()
+    if np.isfinite(values).all() and (values == np.floor(values)).all():
+        return pd.to_numeric(engagements, downcast='integer')
+    return engagements
+
+def parse_dates(df, date_format=None):
+    # Convert 'Date' column to datetime objects using one inferred format for every row
+    # errors='coerce' will convert parsing errors (including rows not matching the format) into NaT (Not a Time)
+    if date_format is None:
+        date_format = infer_date_format(df['date'])
+    df['date'] = pd.to_datetime(df['date'], errors='coerce', format=date_format)
+    # Drop rows where 'date' is NaT (i.e., invalid dates)
+    df.dropna(subset=['date'], inplace=True)
+    return df
+
+def apply_schema(df):
+    # Fill missing 'Engagements' with 0, then narrow to the most compact numeric type
+    df['engagements'] = narrow_engagements(df['engagements'].fillna(0).astype(float))
+    # Dimension columns become categoricals, which also makes every groupby on them much cheaper
+    df = df.astype(CATEGORICAL_SCHEMA)
+    # Renumber rows 0..n-1 so the frame can be written to columnar storage as-is
+    df.index = pd.RangeIndex(len(df))
+    return df
+
+def clean_media_data(raw_df, date_format=None):
+    df = normalize_columns(raw_df)
+    df = parse_dates(df, date_format)
+    return apply_schema(df)
+
+def frame_memory_bytes(df):
+    # deep=True counts the Python string objects behind object columns, not just their pointers
+    return int(df.memory_usage(deep=True).sum())
+
+def read_media_csv(csv_file):
+    # Parse and clean a whole CSV; the before/after memory report is kept in df.attrs['memory_report'].
+    # Same steps as clean_media_data, recorded as separate stages when instrumentation is on.
+    with stage('csv_read') as fields:
+        raw_df = pd.read_csv(csv_file)
+        fields['rows'] = len(raw_df)
+    parsed_bytes = frame_memory_bytes(raw_df) # Measured before cleaning, which modifies raw_df in place
+    with stage('normalize_columns'):
+        df = normalize_columns(raw_df)
+    with stage('date_parse') as fields:
+        df = parse_dates(df)
+        fields['rows'] = len(df)
+    with stage('apply_schema'):
+        df = apply_schema(df)
+    df.attrs['memory_report'] = {'parsed_bytes': parsed_bytes, 'cleaned_bytes': frame_memory_bytes(df)}
+    return df
+
+# --- Parallel CSV Parsing ---
+# Files smaller than this are parsed serially; process start-up and result transfer outweigh the gain
+PARALLEL_PARSE_MIN_BYTES = 32 * 1024 * 1024
+
+class SerialParseRequired(Exception):
+    # The parallel path cannot reproduce the serial result exactly for this file
+    pass
+
+def csv_range_boundaries(buffer, parts):
+    # Split points for `parts` byte ranges of a CSV held in `buffer` (bytes or mmap). Every range starts right
+    # after a newline that is outside quotes: an even number of '"' before it, so no quoted field spans two
+    # ranges. Returns (header end, [range starts..., end of data]).
+    header_end = buffer.find(b'\n') + 1
+    if header_end == 0:
+        raise SerialParseRequired("no data rows")
+    size = len(buffer)
+    boundaries = [header_end]
+    quotes, counted_to = 0, header_end
+    for part in range(1, parts):
+        target = header_end + (size - header_end) * part // parts
+        candidate = buffer.find(b'\n', max(target, counted_to)) + 1
+        while 0 < candidate < size:
+            quotes += buffer[counted_to:candidate].count(b'"')
+            counted_to = candidate
+            if quotes % 2 == 0:
+                boundaries.append(candidate)
+                break
+            # Inside a quoted field: try the next newline
+            candidate = buffer.find(b'\n', candidate) + 1
+    boundaries.append(size)
+    return header_end, boundaries
+
+def parse_csv_range(path, header, start, end, date_format):
+    # Process pool worker: parse and clean one byte range of the file at `path`.
+    # Does everything clean_media_data does except narrowing engagements, which needs all ranges together.
+    with open(path, 'rb') as csv_file:
+        csv_file.seek(start)
+        data = csv_file.read(end - start)
+    raw_df = pd.read_csv(io.BytesIO(header + data))
+    parsed_rows, parsed_bytes = len(raw_df), frame_memory_bytes(raw_df)
+    df = parse_dates(normalize_columns(raw_df), date_format)
+    df['engagements'] = df['engagements'].fillna(0).astype(float)
+    return df.astype(CATEGORICAL_SCHEMA), parsed_rows, parsed_bytes
+
+def union_categorical_columns(columns):
+    # Combine one categorical column from every range, with the sorted categories astype('category') gives
+    # the whole column. Ranges with no values at all take the other ranges' category dtype.
+    category_dtypes = {column.cat.categories.dtype for column in columns if len(column.cat.categories)}
+    if len(category_dtypes) > 1:
+        raise SerialParseRequired("column parsed with different types in different ranges")
+    if category_dtypes:
+        empty = pd.CategoricalDtype(pd.Index([], dtype=category_dtypes.pop()))
+        columns = [column if len(column.cat.categories) else column.astype(empty) for column in columns]
+    return pd.Series(pd.api.types.union_categoricals(columns, sort_categories=True, ignore_order=True))
+
+def read_media_csv_parallel(csv_file, executor, workers):
+    # Same result as read_media_csv, parsed by `workers` processes of `executor`: the file is split into
+    # byte ranges at line boundaries, each range is parsed and cleaned in a worker using one date format
+    # inferred up front, and the cleaned ranges are reassembled in file order. Falls back to read_media_csv
+    # whenever the ranges could not reproduce the serial result exactly.
+    spooled = None
+    if isinstance(csv_file, str):
+        source = csv_file
+    else:
+        size = csv_file.seek(0, os.SEEK_END)
+        csv_file.seek(0)
+        if workers < 2 or size < PARALLEL_PARSE_MIN_BYTES:
+            return read_media_csv(csv_file)
+        # An upload is spooled to a temporary file and handled like a path: the workers read their own ranges,
+        # so no copy of the upload (or of its ranges) is held in memory next to the upload itself
+        spooled = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+        with spooled:
+            shutil.copyfileobj(csv_file, spooled)
+        source = spooled.name
+    with open(source, 'rb') as handle:
+        buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(source) else b''
+    try:
+        if workers < 2 or len(buffer) < PARALLEL_PARSE_MIN_BYTES:
+            raise SerialParseRequired("file too small to split")
+        header_end, boundaries = csv_range_boundaries(buffer, workers)
+        if len(boundaries) < 3:
+            raise SerialParseRequired("no split point outside quoted fields")
+        header = bytes(buffer[:header_end])
+        # One date format for every range, inferred from the head of the file exactly like the serial path
+        sample = normalize_columns(pd.read_csv(io.BytesIO(bytes(buffer[:boundaries[1]])), nrows=DATE_FORMAT_SAMPLE_SIZE * 10))
+        date_format = infer_date_format(sample['date'])
+        if date_format is None:
+            raise SerialParseRequired("no single date format") # pandas would guess per range
+        ranges = list(zip(boundaries[:-1], boundaries[1:]))
+        with stage('csv_parse_parallel', workers=workers, ranges=len(ranges)) as fields:
+            futures = [executor.submit(parse_csv_range, source, header, start, end, date_format) for start, end in ranges]
+            results = [future.result() for future in futures]
+            fields['rows'] = sum(parsed_rows for _, parsed_rows, _ in results)
+        frames = [frame for frame, _, _ in results]
+        for column in frames[0].columns:
+            if column not in CATEGORICAL_SCHEMA and len({frame[column].dtype for frame in frames}) > 1:
+                raise SerialParseRequired(f"column '{column}' parsed with different types in different ranges")
+        with stage('csv_reassemble'):
+            # Categorical columns are combined separately, so their categories end up sorted like the serial path
+            df = pd.concat([frame.drop(columns=list(CATEGORICAL_SCHEMA)) for frame in frames], ignore_index=True)
+            for column in CATEGORICAL_SCHEMA:
+                df[column] = union_categorical_columns([frame[column] for frame in frames])
+            df = df[frames[0].columns]
+            df['engagements'] = narrow_engagements(df['engagements'])
+    except SerialParseRequired:
+        if spooled is not None:
+            csv_file.seek(0)
+        return read_media_csv(csv_file)
+    finally:
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+        if spooled is not None:
+            os.remove(spooled.name)
+    df.attrs['memory_report'] = {'parsed_bytes': sum(parsed_bytes for _, _, parsed_bytes in results), 'cleaned_bytes': frame_memory_bytes(df)}
+    return df
+
+# --- Aggregation Engine ---
+# Dimension columns the charts are rolled up from
+DIMENSION_COLUMNS = ['platform', 'sentiment', 'mediatype', 'location']
+# Columns identifying one row of the grouped (partial aggregate) frame
+GROUP_KEYS = ['date'] + DIMENSION_COLUMNS
+# Number of locations shown in the Top Locations chart
+TOP_LOCATIONS = 5
+# Rows parsed per chunk in streaming mode; peak memory scales with this, not with file size
+DEFAULT_CHUNK_ROWS = 250_000
+# Columns that can be summarized by a heavy-hitters sketch instead of exact per-value sums
+SKETCH_COLUMNS = ('location', 'platform')
+# Counters per sketch; the error bound shrinks as 1 / (capacity + 1)
+DEFAULT_SKETCH_CAPACITY = 1000
+# Bars shown in the platform chart when platforms are sketched (exact mode shows every platform)
+APPROXIMATE_TOP_PLATFORMS = 20
+# Trend chart bucket sizes, finest first, with their approximate widths
+TREND_FREQUENCIES = {'h': 'Hourly', 'D': 'Daily', 'W': 'Weekly', 'MS': 'Monthly'}
+TREND_BUCKET_WIDTHS = {'h': pd.Timedelta(hours=1), 'D': pd.Timedelta(days=1), 'W': pd.Timedelta(weeks=1), 'MS': pd.Timedelta(days=30.44)}
+# Automatic bucket selection picks the finest size that keeps the trend within this many points
+TREND_AUTO_MAX_BUCKETS = 400
+# Longer trends are LTTB-downsampled to this many points before plotting
+TREND_POINT_BUDGET = 2000
+# Above this many points the trend is drawn with WebGL (Scattergl) instead of SVG
+WEBGL_POINT_THRESHOLD = 1000
+# Markers are only drawn on trends with at most this many points
+MARKER_POINT_LIMIT = 200
+
+@dataclass(frozen=True)
+class DashboardAggregates:
+    # Everything the five charts and their insights need, derived from a single grouped pass
+    row_count: int
+    sentiment_counts: pd.Series # sentiment -> rows, most common first
+    trend_engagements: pd.Series # bucket start -> total engagements at trend_frequency, including empty buckets
+    trend_frequency: str # 'h' for short date spans, 'D' otherwise
+    daily_engagements: pd.Series # day -> total engagements, including empty days
+    daily_platform_engagements: pd.DataFrame # day x platform -> total engagements, same days as daily_engagements
+    platform_engagements: pd.Series # platform -> total engagements, ordered by platform
+    media_type_counts: pd.Series # media type -> rows, most common first
+    top_locations: pd.Series # location -> total engagements, highest TOP_LOCATIONS only
+    # Columns whose figures come from a HeavyHitters sketch -> {'capacity', 'error_bound', 'total_weight'}.
+    # Empty when every figure is exact.
+    approximations: dict = field(default_factory=dict)
+
+    @property
+    def nbytes(self):
+        # Approximate in-memory size, used when budgeting caches
+        total = 0
+        for value in vars(self).values(): # Sketch metadata is a few numbers and not counted
+            if isinstance(value, pd.DataFrame):
+                total += frame_memory_bytes(value)
+            elif isinstance(value, pd.Series):
+                total += int(value.memory_usage(deep=True))
+        return total
+
+class HeavyHitters:
+    # Weighted Misra-Gries summary: estimated engagement totals for at most `capacity` distinct values.
+    # Every estimate is below the exact total by at most error_bound, and error_bound <= total_weight / (capacity + 1),
+    # so any value with more than that share of all engagements is guaranteed to be tracked. Summaries of
+    # separate chunks or files merge into a summary of their union with the same guarantee. Weights must be
+    # non-negative.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = pd.Series(dtype='float64') # value -> estimated total
+        self.total_weight = 0.0
+        self.error_bound = 0.0 # Sum of all decrements: the most any estimate can be below its exact total
+
+    def update(self, values, weights):
+        # Add one batch; weights are summed per value first, so a batch costs one groupby plus one trim
+        sums = weights.astype('float64').groupby(values, observed=True, sort=False).sum()
+        if (sums < 0).any():
+            raise ValueError("HeavyHitters weights must be non-negative")
+        sums.index = sums.index.astype(object)
+        self._absorb(sums)
+        self.total_weight += float(sums.sum())
+
+    @classmethod
+    def merged(cls, sketches):
+        result = cls(max(sketch.capacity for sketch in sketches))
+        for sketch in sketches:
+            result._absorb(sketch.counters)
+            result.total_weight += sketch.total_weight
+            result.error_bound += sketch.error_bound
+        return result
+
+    def _absorb(self, sums):
+        counters = self.counters.add(sums, fill_value=0) if len(self.counters) else sums
+        if len(counters) > self.capacity:
+            # Subtract the (capacity + 1)-th largest counter from all of them and drop the ones that reach zero.
+            # Each trim removes at least (capacity + 1) * cut of weight, which is what bounds the error.
+            values = counters.to_numpy()
+            cut = np.partition(values, len(values) - self.capacity - 1)[len(values) - self.capacity - 1]
+            counters = counters[values > cut] - cut
+            self.error_bound += cut
+        self.counters = counters
+
+    def top(self, k):
+        # The k largest estimates, highest first
+        return self.counters.nlargest(k).rename('engagements')
+
+    def describe(self):
+        return {'capacity': self.capacity, 'error_bound': self.error_bound, 'total_weight': self.total_weight}
+
+def choose_trend_frequency(start, end, finest='h'):
+    # Finest bucket size (no finer than `finest`) that keeps the span within TREND_AUTO_MAX_BUCKETS points
+    frequencies = list(TREND_FREQUENCIES)
+    for freq in frequencies[frequencies.index(finest):]:
+        if (end - start) / TREND_BUCKET_WIDTHS[freq] <= TREND_AUTO_MAX_BUCKETS:
+            return freq
+    return frequencies[-1]
+
+def group_media_data(df, freq='D', sketch_columns=(), sketch_capacity=DEFAULT_SKETCH_CAPACITY):
+    # Single scan of the cleaned frame: row counts and engagement sums per time bucket x dimension combination.
+    # dropna=False keeps rows with a missing dimension so they still count towards the other charts.
+    # Columns in sketch_columns are left out of the grouping, which keeps the grouped frame small for
+    # high-cardinality columns; their engagements go into HeavyHitters sketches kept in groups.attrs['sketches'].
+    dimensions = [column for column in DIMENSION_COLUMNS if column not in sketch_columns]
+    keys = [df['date'].dt.floor(freq)] + [df[column] for column in dimensions]
+    groups = df.groupby(keys, dropna=False, sort=False, observed=True)['engagements'].agg(['size', 'sum'])
+    groups = groups.rename(columns={'size': 'rows', 'sum': 'engagements'}).reset_index()
+    if sketch_columns:
+        sketches = {column: HeavyHitters(sketch_capacity) for column in sketch_columns}
+        # Fed in slices, as a stream would be, so the sketch never holds more than its capacity plus one slice
+        for start in range(0, len(df), DEFAULT_CHUNK_ROWS):
+            rows = df.iloc[start:start + DEFAULT_CHUNK_ROWS]
+            for column, sketch in sketches.items():
+                sketch.update(rows[column], rows['engagements'])
+        groups.attrs['sketches'] = sketches
+    return groups
+
+def merge_groups(parts):
+    # Partial aggregates are plain counts and sums, so merging is concatenation followed by a re-group.
+    # Sketches of the sketched columns are merged alongside.
+    # Empty partials are left out, and a dimension that is missing on every row of a partial (a small chunk
+    # can have one) takes the other partials' dtype: pd.concat ignoring such columns when picking result
+    # dtypes is deprecated.
+    frames = [part for part in parts if len(part)] or parts[:1]
+    for column in DIMENSION_COLUMNS:
+        dtypes = [frame[column].dtype for frame in frames if column in frame.columns and frame[column].notna().any()]
+        if dtypes:
+            frames = [frame if column not in frame.columns or frame[column].notna().any() else frame.astype({column: dtypes[0]})
+                      for frame in frames]
+    combined = pd.concat(frames, ignore_index=True)
+    keys = [column for column in GROUP_KEYS if column in combined.columns]
+    merged = combined.groupby(keys, dropna=False, sort=False, observed=True)[['rows', 'engagements']].sum().reset_index()
+    part_sketches = [part.attrs['sketches'] for part in parts if 'sketches' in part.attrs]
+    if part_sketches:
+        merged.attrs['sketches'] = {column: HeavyHitters.merged([sketches[column] for sketches in part_sketches])
+                                    for column in part_sketches[0]}
+    return merged
+
+def coarsen_groups(groups, freq):
+    # Re-bucket grouped partial aggregates to a coarser time bucket (e.g. hourly groups to daily)
+    return merge_groups([groups.assign(date=groups['date'].dt.floor(freq))])
+
+def drop_covered_hours(groups, covered_hours=None):
+    # For merging overlapping exports: drops the group rows in hours that earlier files already cover, so a later
+    # file keeps its part of a day an earlier file only partly covers. Groups with every bucket at midnight (long
+    # exports grouped by day, or date-only exports) carry no time of day: a day is dropped whole when any of its
+    # hours is covered, and a kept day covers all of its hours.
+    # Returns (remaining groups, hours covered once these groups are added).
+    buckets = groups['date']
+    daily = bool((buckets == buckets.dt.normalize()).all())
+    if covered_hours is not None:
+        if 'sketches' in groups.attrs:
+            raise ValueError("Sketched columns cannot drop overlapping hours; use exact mode to skip them")
+        overlapping = buckets.isin(covered_hours.normalize() if daily else covered_hours)
+        groups, buckets = groups[~overlapping], buckets[~overlapping]
+    hours = pd.DatetimeIndex(buckets.unique())
+    if daily:
+        hours = hours.repeat(24) + pd.to_timedelta(np.tile(np.arange(24), len(hours)), unit='h')
+    return groups, hours if covered_hours is None else covered_hours.union(hours)
+
+def stream_grouped_media_data(csv_file, chunk_rows, on_progress=None, sketch_columns=(), sketch_capacity=DEFAULT_SKETCH_CAPACITY):
+    # Read the CSV chunk by chunk, cleaning each chunk and folding its partial aggregates into a running total.
+    # Only one chunk plus the grouped frame (bounded by group cardinality) is ever held in memory.
+    # Chunks are grouped by hour, like the full frame of a short export, until the dates seen so far span too
+    # long for hourly buckets; the running total is then coarsened to days once and later chunks grouped daily.
+    groups = None
+    date_format = None
+    freq = 'h'
+    first_date = last_date = None
+    rows_read = 0
+    started = time.perf_counter()
+    with stage('csv_stream', chunk_rows=chunk_rows) as fields, pd.read_csv(csv_file, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            rows_read += len(chunk)
+            chunk = normalize_columns(chunk)
+            if date_format is None:
+                # Infer the date format once, from the first chunk, and reuse it for the rest of the file
+                date_format = infer_date_format(chunk['date'])
+            df = clean_media_data(chunk, date_format)
+            if freq == 'h' and len(df):
+                first_date = df['date'].min() if first_date is None else min(first_date, df['date'].min())
+                last_date = df['date'].max() if last_date is None else max(last_date, df['date'].max())
+                if grouping_frequency(pd.Series([first_date, last_date])) == 'D':
+                    freq = 'D'
+                    groups = None if groups is None else coarsen_groups(groups, 'D')
+            partial = group_media_data(df, freq, sketch_columns, sketch_capacity)
+            groups = partial if groups is None else merge_groups([groups, partial])
+            if on_progress is not None:
+                on_progress(rows_read, time.perf_counter() - started)
+        fields['rows'] = rows_read
+    return groups
+
+# Each chart's series is a roll-up of the (small) grouped frame; every step below is cheap
+def _counts_by(groups, column):
+    return groups.groupby(column, observed=True)['rows'].sum().sort_values(ascending=False, kind='stable')
+
+def _engagements_by(groups, column):
+    return groups.groupby(column, observed=True)['engagements'].sum()
+
+def summarize_sentiment(groups):
+    return _counts_by(groups, 'sentiment')
+
+def summarize_trend(groups):
+    # Returns (trend, trend frequency, daily engagements, daily engagements per platform)
+    trend = _engagements_by(groups, 'date')
+    # Groups are hourly when any bucket starts off midnight (short date spans), daily otherwise
+    trend_frequency = 'h' if (trend.index != trend.index.normalize()).any() else 'D'
+    # resample() fills buckets without any rows with zero engagements
+    trend = trend.resample(trend_frequency).sum()
+    daily = trend.resample('D').sum() if trend_frequency == 'h' else trend
+    if 'platform' in groups.columns:
+        daily_platform = groups.groupby([groups['date'].dt.floor('D'), 'platform'], observed=True)['engagements'].sum().unstack(fill_value=0)
+        daily_platform = daily_platform.reindex(daily.index, fill_value=0)
+    else:
+        daily_platform = pd.DataFrame(index=daily.index) # Platforms are sketched; there is no per-day split
+    daily_platform.columns.name = 'platform'
+    return trend, trend_frequency, daily, daily_platform
+
+def summarize_platforms(groups):
+    return _engagements_by(groups, 'platform')
+
+def summarize_media_types(groups):
+    return _counts_by(groups, 'mediatype')
+
+def summarize_locations(groups):
+    return _engagements_by(groups, 'location').nlargest(TOP_LOCATIONS)
+
+def summarize_groups(groups):
+    with stage('aggregate.summarize', rows=len(groups)):
+        sketches = groups.attrs.get('sketches', {})
+        trend, trend_frequency, daily, daily_platform = summarize_trend(groups)
+        if 'platform' in sketches:
+            platform_engagements = sketches['platform'].top(APPROXIMATE_TOP_PLATFORMS).rename_axis('platform')
+        else:
+            platform_engagements = summarize_platforms(groups)
+        if 'location' in sketches:
+            top_locations = sketches['location'].top(TOP_LOCATIONS).rename_axis('location')
+        else:
+            top_locations = summarize_locations(groups)
+        return DashboardAggregates(
+            row_count=int(groups['rows'].sum()),
+            sentiment_counts=summarize_sentiment(groups),
+            trend_engagements=trend,
+            trend_frequency=trend_frequency,
+            daily_engagements=daily,
+            daily_platform_engagements=daily_platform,
+            platform_engagements=platform_engagements,
+            media_type_counts=summarize_media_types(groups),
+            top_locations=top_locations,
+            approximations={column: sketch.describe() for column, sketch in sketches.items()},
+        )
+
+def grouping_frequency(dates):
+    # Short date spans are grouped by hour so the trend chart can show hourly buckets
+    return 'h' if choose_trend_frequency(dates.min(), dates.max()) == 'h' else 'D'
+
+def summarize_merged_groups(groups):
+    # Groups merged from several files can mix hourly buckets (short files) with daily ones; hourly resolution
+    # is only kept while the combined span is short enough for it
+    if grouping_frequency(groups['date']) == 'D':
+        groups = coarsen_groups(groups, 'D')
+    return summarize_groups(groups)
+
+def compute_dashboard_aggregates(df, sketch_columns=(), sketch_capacity=DEFAULT_SKETCH_CAPACITY):
+    with stage('aggregate.group', rows=len(df)) as fields:
+        groups = group_media_data(df, grouping_frequency(df['date']), sketch_columns, sketch_capacity)
+        fields['groups'] = len(groups)
+    return summarize_groups(groups)
+
+# --- Trend Chart Downsampling ---
+def lttb_indices(values, n_out):
+    # Largest-Triangle-Three-Buckets (Steinarsson, 2013) on an evenly spaced series. Keeps the first and last
+    # points and, from each of n_out - 2 equal buckets, the point forming the largest triangle with the point
+    # kept before it and the mean of the next bucket. Peaks and dips survive, unlike with plain averaging.
+    n = len(values)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    y = np.asarray(values, dtype=float)
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64) # Bucket boundaries over the interior points
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x, next_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        # Twice the triangle area for every candidate in the bucket at once
+        areas = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous]) - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(areas.argmax())
+        kept[bucket + 1] = previous
+    return kept
+
+def prepare_trend_series(trend, trend_frequency, freq):
+    # Re-bucket a trend stored at `trend_frequency` to `freq`, then downsample it to TREND_POINT_BUDGET points
+    # if it is still too long. Returns (series to plot, number of buckets before downsampling).
+    if freq != trend_frequency:
+        trend = trend.resample(freq).sum()
+    bucket_count = len(trend)
+    if bucket_count > TREND_POINT_BUDGET:
+        trend = trend.iloc[lttb_indices(trend.to_numpy(), TREND_POINT_BUDGET)]
+    return trend, bucket_count
+
+# --- Insight Generation Functions ---
+# These functions calculate and return a list of textual insights based on chart data
+def get_sentiment_insights(sentiment_counts):
+    total = sentiment_counts.sum()
+    top_sentiments = sentiment_counts.nlargest(2) # Only the top two are reported, so skip a full sort
+    insights = []
+    insights.append(f"This chart describes the distribution of sentiment (positive/negative/neutral) towards a brand, campaign, or topic, providing a quick snapshot of public perception.")
+    if len(top_sentiments) > 0:
+        insights.append(f"1. The dominant sentiment is \"{top_sentiments.index[0]}\" accounting for {((top_sentiments.iloc[0] / total) * 100):.1f}% of all entries. This indicates the primary public opinion.")
+    if len(top_sentiments) > 1:
+        insights.append(f"2. \"{top_sentiments.index[1]}\" is the second most common sentiment, showing varied public opinion.")
+    if len(sentiment_counts) > 2:
+        insights.append(f"3. Understanding the sentiment distribution is crucial for crafting effective communication strategies.")
+
+    # Consolidated Recommendation
+    insights.append(f"Recommendation: If dominant sentiment is negative, develop a crisis communication plan. If positive, amplify successful content. If neutral, engage to convert to positive advocates.")
+    return insights
+
+def get_engagement_trend_insights(daily_engagements):
+    insights = []
+    if len(daily_engagements) == 0: return insights
+    insights.append(f"This chart shows fluctuations in content engagement over time, ideal for tracking media campaign performance and identifying peaks or declines. It provides a dynamic view of audience interaction.")
+
+    engagements = daily_engagements.to_numpy()
+    # argmax/argmin return the first occurrence, like list.index() did, in a single vectorized pass each
+    max_position = engagements.argmax()
+    min_position = engagements.argmin()
+    max_date_str = daily_engagements.index[max_position].strftime('%Y-%m-%d')
+    min_date_str = daily_engagements.index[min_position].strftime('%Y-%m-%d')
+
+
+    insights.append(f"1. Peak engagement occurred around {max_date_str}, reaching {engagements[max_position]:,.0f} total engagements. Analyze this date to identify triggers for the surge.")
+    insights.append(f"2. The lowest engagement period was around {min_date_str}, with only {engagements[min_position]:,.0f} engagements. Investigate this decline to prevent similar issues.")
+
+    # Both half-period totals come from one cumulative sum
+    cumulative = engagements.cumsum()
+    half = len(engagements) // 2
+    first_half_engagements = cumulative[half - 1] if half > 0 else 0
+    second_half_engagements = cumulative[-1] - first_half_engagements
+
+    if second_half_engagements > first_half_engagements:
+        insights.append('3. Engagement trends show an increase in the latter half, indicating positive results from your content strategy.')
+    elif second_half_engagements < first_half_engagements:
+        insights.append('3. A decline in engagement is observed in the latter half, suggesting deeper analysis into content performance is needed.')
+    else:
+        insights.append('3. Engagement levels remained relatively stable, indicating consistent audience interaction.')
+
+    # Consolidated Recommendation
+    insights.append(f"Recommendation: Replicate successful content strategies during peak periods. Analyze content from low engagement periods to identify weaknesses and adjust your content calendar. Continue current strategies for growth, or explore new tactics to break stagnation.")
+    return insights
+
+def get_platform_insights(platform_engagements):
+    top_platforms = platform_engagements.nlargest(2)
+    insights = []
+    insights.append(f"This chart compares engagement performance across social media platforms or news portals, helping to identify the most effective platforms for reach and interaction. This is crucial for optimizing resource allocation.")
+    if len(top_platforms) > 0:
+        insights.append(f"1. \"{top_platforms.index[0]}\" is the leading platform, generating {top_platforms.iloc[0]:,.0f} engagements. This highlights your most effective channel.")
+    if len(top_platforms) > 1:
+        insights.append(f"2. \"{top_platforms.index[1]}\" also shows strong performance with {top_platforms.iloc[1]:,.0f} engagements, indicating significant potential for diversification.")
+    insights.append('3. Disparities in engagement across platforms emphasize the importance of strategically allocating resources for the highest engagement ROI.')
+
+    # Consolidated Recommendation
+    insights.append(f"Recommendation: Allocate more budget/resources to leading platforms and analyze successful content types for cross-platform adaptation. Consider reducing investment in underperforming platforms or re-evaluating their role in your overall media strategy.")
+    return insights
+
+def get_platform_anomaly_insights(daily_platform_engagements, window=7, threshold=3.0):
+    # Flags days where a platform deviates more than `threshold` standard deviations from its own trailing
+    # `window`-day average. Rolling statistics run over every platform column at once.
+    insights = []
+    insights.append(f"This analysis compares each platform's daily engagement with its trailing {window}-day average to flag unusual spikes and drops.")
+    if daily_platform_engagements.shape[1] == 0:
+        insights.append("1. Daily per-platform figures are not available while platforms are approximated; switch to exact mode to detect anomalies.")
+        return insights
+    # shift(1) keeps each day out of its own baseline, so a spike cannot mask itself
+    rolling = daily_platform_engagements.rolling(window, min_periods=window)
+    baseline = rolling.mean().shift(1)
+    spread = rolling.std().shift(1).replace(0, np.nan)
+    zscores = (daily_platform_engagements - baseline) / spread
+    if zscores.isna().all().all():
+        insights.append(f"1. At least {window + 1} days of varying data per platform are needed to detect anomalies.")
+        return insights
+
+    spikes = (zscores > threshold).sum()
+    drops = (zscores < -threshold).sum()
+    if spikes.sum() + drops.sum() == 0:
+        insights.append(f"1. No platform moved more than {threshold:.0f} standard deviations away from its {window}-day average; engagement has been steady.")
+    else:
+        peak_day, peak_platform = zscores.stack().idxmax()
+        if zscores.at[peak_day, peak_platform] > threshold:
+            insights.append(f"1. The strongest spike was on \"{peak_platform}\" on {peak_day.strftime('%Y-%m-%d')}: {daily_platform_engagements.at[peak_day, peak_platform]:,.0f} engagements against a {window}-day average of {baseline.at[peak_day, peak_platform]:,.0f}.")
+        else:
+            insights.append(f"1. No spikes were detected; every anomaly was a drop below the {window}-day average.")
+        most_anomalous = (spikes + drops).idxmax()
+        insights.append(f"2. \"{most_anomalous}\" had the most anomalous days ({spikes[most_anomalous]} spikes, {drops[most_anomalous]} drops).")
+    # Coefficient of variation of daily engagement, computed for all platforms in one vectorized step
+    volatility = (daily_platform_engagements.std() / daily_platform_engagements.mean().replace(0, np.nan)).dropna()
+    if len(volatility) > 0:
+        insights.append(f"3. \"{volatility.idxmax()}\" is the most volatile platform day to day (coefficient of variation {volatility.max():.2f}).")
+
+    insights.append(f"Recommendation: Review the content and events behind each spike to repeat what worked, and check drops for outages, algorithm changes or negative coverage.")
+    return insights
+
+def get_media_type_insights(media_type_counts):
+    total = media_type_counts.sum()
+    top_media_types = media_type_counts.nlargest(2)
+    insights = []
+    insights.append(f"This chart analyzes the proportion of media types, providing insight into your audience's most preferred content formats. This is key for an audience-centric content strategy.")
+    if len(top_media_types) > 0:
+        insights.append(f"1. \"{top_media_types.index[0]}\" is the most frequently used media type, accounting for {((top_media_types.iloc[0] / total) * 100):.1f}% of content. This indicates a clear audience preference.")
+    if len(top_media_types) > 1:
+        insights.append(f"2. \"{top_media_types.index[1]}\" is the second most common, indicating audiences also respond well to this format.")
+    insights.append('3. Analyzing engagement rates per media type is crucial for optimizing content strategy and discovering new opportunities.')
+
+    # Consolidated Recommendation
+    insights.append(f"Recommendation: Prioritize creating more content in preferred formats. Maintain a healthy mix of content by continuing to produce other media types, and explore ways to enhance their impact. Experiment with converting high-performing content between formats.")
+    return insights
+
+def get_location_insights(top_locations):
+    top_locations = top_locations.nlargest(2)
+    insights = []
+    insights.append(f"This chart identifies geographical locations with the highest total engagement, relevant for audience targeting or localized content production. This helps inform regional marketing decisions.")
+    if len(top_locations) > 0:
+        insights.append(f"1. The top location for engagements is \"{top_locations.index[0]}\" with {top_locations.iloc[0]:,.0f} total engagements. This indicates audiences in this region are highly active.")
+    if len(top_locations) > 1:
+        insights.append(f"2. \"{top_locations.index[1]}\" is the second highest, indicating key geographical areas for focus.")
+    insights.append('3. Knowing high-engagement locations allows you to design more targeted marketing campaigns or develop culturally relevant content.')
+
+    # Consolidated Recommendation
+    insights.append(f"Recommendation: Launch localized campaigns, run geo-targeted ads, or create region-specific content to deepen engagement in top locations. Explore expanding your presence or tailoring content for secondary high-engagement locations.")
+    return insights
+
+def generate_insights(aggregates):
+    # Every insight list shown on the dashboard, keyed by chart
+    return {
+        'sentiment': get_sentiment_insights(aggregates.sentiment_counts),
+        'engagement_trend': get_engagement_trend_insights(aggregates.daily_engagements),
+        'platform': get_platform_insights(aggregates.platform_engagements),
+        'platform_anomalies': get_platform_anomaly_insights(aggregates.daily_platform_engagements),
+        'media_type': get_media_type_insights(aggregates.media_type_counts),
+        'location': get_location_insights(aggregates.top_locations),
+    }
+
+def _series_to_dict(series):
+    # JSON-friendly mapping: timestamps become ISO strings, numpy scalars become Python numbers
+    return {key.isoformat() if isinstance(key, pd.Timestamp) else str(key): value for key, value in series.to_dict().items()}
+
+def aggregates_to_dict(aggregates):
+    return {
+        'row_count': aggregates.row_count,
+        'sentiment_counts': _series_to_dict(aggregates.sentiment_counts),
+        'trend_frequency': aggregates.trend_frequency,
+        'daily_engagements': _series_to_dict(aggregates.daily_engagements),
+        'daily_platform_engagements': {str(platform): _series_to_dict(daily) for platform, daily in aggregates.daily_platform_engagements.items()},
+        'platform_engagements': _series_to_dict(aggregates.platform_engagements),
+        'media_type_counts': _series_to_dict(aggregates.media_type_counts),
+        'top_locations': _series_to_dict(aggregates.top_locations),
+        'approximations': aggregates.approximations,
+    }
+
+# --- Figure Construction ---
+# Bump whenever the templates or builders below change, so cached figures are rebuilt instead of reused
+FIGURE_STYLE_VERSION = 1
+
+# The dashboard's dark theme, registered once as Plotly templates instead of being repeated in every chart's
+# update_layout. 'media_dark' extends Plotly's default template; the pie and cartesian variants are merged
+# ahead of time so no template composition happens while a figure is built.
+pio.templates['media_dark'] = pio.templates.merge_templates('plotly', go.layout.Template(layout=dict(
+    paper_bgcolor='rgba(0,0,0,0)',
+    plot_bgcolor='rgba(0,0,0,0)',
+    font=dict(color='#E0E0E0', family='Inter, sans-serif'),
+    height=400, # Fixed height for consistency
+)))
+pio.templates['media_dark_pie'] = pio.templates.merge_templates('media_dark', go.layout.Template(layout=dict(
+    legend=dict(font=dict(color='#E0E0E0')),
+    margin=dict(l=20, r=20, b=20, t=60),
+)))
+pio.templates['media_dark_cartesian'] = pio.templates.merge_templates('media_dark', go.layout.Template(layout=dict(
+    xaxis=dict(gridcolor='#444'), # Customize grid color
+    yaxis=dict(gridcolor='#444'),
+    margin=dict(l=60, r=20, b=60, t=60),
+)))
+
+def figure_fingerprint(chart, data):
+    # Identifies a figure by its chart, the Series it plots and the styling version, so equal inputs can reuse
+    # an already built figure. Hashes values and index together; names are part of the key too.
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{chart}|v{FIGURE_STYLE_VERSION}|{data.name}|{data.index.name}|{data.dtype}".encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+# Each builder returns a Plotly figure styled for the dashboard's dark theme
+def build_sentiment_figure(aggregates):
+    sentiment_counts = aggregates.sentiment_counts
+    return px.pie(
+        names=sentiment_counts.index,
+        values=sentiment_counts.values,
+        hole=0.4,
+        title='Sentiment Breakdown',
+        color_discrete_sequence=['#636EFA', '#EF553B', '#00CC96', '#FFA15A', '#19D3F3'],
+        template='media_dark_pie'
+    )
+
+def resolve_trend_frequency(aggregates, granularity='auto'):
+    # 'auto' adapts the bucket size to the date span; explicit sizes finer than the stored trend are not possible
+    if granularity != 'auto':
+        return granularity
+    trend_index = aggregates.trend_engagements.index
+    return choose_trend_frequency(trend_index.min(), trend_index.max(), aggregates.trend_frequency)
+
+def build_trend_figure(trend_series):
+    return px.line(
+        trend_series.reset_index(),
+        x='date',
+        y='engagements',
+        title='Engagement Trend Over Time',
+        labels={'date': 'Date', 'engagements': 'Total Engagements'},
+        markers=len(trend_series) <= MARKER_POINT_LIMIT, # Thousands of SVG markers make the page sluggish
+        line_shape='linear',
+        render_mode='webgl' if len(trend_series) > WEBGL_POINT_THRESHOLD else 'svg',
+        color_discrete_sequence=['#636EFA'],
+        template='media_dark_cartesian'
+    )
+
+def build_platform_figure(aggregates):
+    return px.bar(
+        aggregates.platform_engagements.reset_index(),
+        x='platform',
+        y='engagements',
+        title='Platform Engagements',
+        labels={'platform': 'Platform', 'engagements': 'Total Engagements'},
+        color_discrete_sequence=['#EF553B'],
+        template='media_dark_cartesian'
+    )
+
+def build_media_type_figure(aggregates):
+    media_type_counts = aggregates.media_type_counts
+    return px.pie(
+        names=media_type_counts.index,
+        values=media_type_counts.values,
+        hole=0.4,
+        title='Media Type Mix',
+        color_discrete_sequence=['#00CC96', '#FFA15A', '#19D3F3', '#FF6692', '#B6E880'],
+        template='media_dark_pie'
+    )
+
+def build_location_figure(aggregates):
+    return px.bar(
+        aggregates.top_locations.reset_index(),
+        x='location',
+        y='engagements',
+        title=f'Top {TOP_LOCATIONS} Locations by Engagements',
+        labels={'location': 'Location', 'engagements': 'Total Engagements'},
+        color_discrete_sequence=['#FFA15A'],
+        template='media_dark_cartesian'
+    )
+
+def build_dashboard_figures(aggregates, trend_granularity='auto'):
+    # All five dashboard figures, keyed by chart
+    trend_series, _ = prepare_trend_series(aggregates.trend_engagements, aggregates.trend_frequency,
+                                           resolve_trend_frequency(aggregates, trend_granularity))
+    return {
+        'sentiment': build_sentiment_figure(aggregates),
+        'engagement_trend': build_trend_figure(trend_series),
+        'platform': build_platform_figure(aggregates),
+        'media_type': build_media_type_figure(aggregates),
+        'location': build_location_figure(aggregates),
+    }
@@ -0,0 +1,56 @@
+# Precomputed rollup cube over a loaded dataset, so drill-down and cross-filtering between charts read a small
+# table of pre-summed cells instead of the raw rows.
+import numpy as np
+
+from pipeline import DIMENSION_COLUMNS, coarsen_groups, grouping_frequency, summarize_groups
+
+class RollupCube:
+    # One row per non-empty (time bucket, platform, sentiment, mediatype, location) cell with its row count and
+    # engagement sum: exactly the grouped frame the streaming and multi-file modes already produce. Storage is
+    # sparse, since only combinations that occur get a cell. Each dimension also keeps a per-cell category slot
+    # (0 = missing value, n = the n-th category), so a selection is a few lookups over small integer arrays.
+    def __init__(self, groups):
+        if 'sketches' in groups.attrs:
+            raise ValueError("A rollup cube needs every dimension; sketched columns are not kept per cell")
+        # Merged groups can mix hourly and daily buckets; cells are kept at one resolution for the whole span
+        if grouping_frequency(groups['date']) == 'D' and (groups['date'] != groups['date'].dt.normalize()).any():
+            groups = coarsen_groups(groups, 'D')
+        # Merging files with different category sets leaves object columns; slots need categoricals
+        self.cells = groups.astype({column: 'category' for column in DIMENSION_COLUMNS})
+        self.categories = {}
+        self.slots = {}
+        for column in DIMENSION_COLUMNS:
+            values = self.cells[column]
+            self.categories[column] = values.cat.categories
+            slot_dtype = np.min_scalar_type(len(self.categories[column]))
+            self.slots[column] = (values.cat.codes.to_numpy().astype(np.int32) + 1).astype(slot_dtype)
+
+    @property
+    def nbytes(self):
+        return int(self.cells.memory_usage(deep=True).sum()) + sum(slots.nbytes for slots in self.slots.values())
+
+    @property
+    def row_count(self):
+        return int(self.cells['rows'].sum())
+
+    def select(self, selections=None, exclude=None):
+        # Cells matching, per dimension, any of the selected values. `exclude` leaves one dimension unconstrained,
+        # which is how a chart shows its own dimension under a cross-filter: every bar stays clickable.
+        mask = None
+        for column, values in (selections or {}).items():
+            if not values or column == exclude:
+                continue # Nothing selected means no constraint on this dimension
+            codes = self.categories[column].get_indexer(values)
+            lookup = np.zeros(len(self.categories[column]) + 1, dtype=bool)
+            lookup[codes[codes >= 0] + 1] = True
+            column_mask = lookup[self.slots[column]]
+            mask = column_mask if mask is None else mask & column_mask
+        return self.cells if mask is None else self.cells[mask]
+
+    def aggregate(self, selections=None, exclude=None):
+        # DashboardAggregates for the selected cells, or None when nothing matches. Uses the same summaries as the
+        # streaming and multi-file modes, so an empty selection matches the unfiltered dashboard.
+        cells = self.select(selections, exclude)
+        if len(cells) == 0:
+            return None
+        return summarize_groups(cells)
@@ -0,0 +1,69 @@
+# Cross-backend equivalence: every optional engine must produce the same dashboard as pandas (cleaned rows,
+# chart aggregates, figures and insight text). Skipped when DuckDB is not installed.
+import pandas as pd
+import pytest
+
+pytest.importorskip('duckdb')
+
+from benchmark import check_backend_equivalence, generate_media_csv
+
+# Past the head of the file DuckDB's CSV sniffer samples, so late oddities are never seen while sniffing
+LATE_ROW = 60_000
+
+def write_export(path, dates, engagements=None, locations=None):
+    rows = len(dates)
+    pd.DataFrame({
+        'Date': dates,
+        'Platform': [['Twitter', 'News', 'TikTok'][i % 3] for i in range(rows)],
+        'Sentiment': [['Positive', 'Negative'][i % 2] for i in range(rows)],
+        'Location': locations if locations is not None else [f"City {i % 7}" for i in range(rows)],
+        'Engagements': engagements if engagements is not None else [float(i % 50) for i in range(rows)],
+        'Media Type': [['Text', 'Video'][i % 2] for i in range(rows)],
+    }).to_csv(path, index=False)
+
+def late_bad_date(path):
+    dates = pd.date_range('2023-01-01', periods=LATE_ROW, freq='min').strftime('%Y-%m-%d %H:%M').tolist()
+    write_export(path, dates + ['not a date', '2023-03-01 10:00'])
+
+def late_text_engagement(path):
+    dates = pd.date_range('2023-01-01', periods=LATE_ROW + 2, freq='min').strftime('%Y-%m-%d %H:%M').tolist()
+    write_export(path, dates, engagements=[str(i % 50) for i in range(LATE_ROW)] + ['n/a', '7'])
+
+def ambiguous_day_month(path):
+    # Every day and month is 12 or less, so nothing in the file itself tells MM/DD from DD/MM
+    dates = [f"{month:02d}/{day:02d}/2023" for month in range(1, 13) for day in range(1, 13)] * 10
+    write_export(path, dates)
+
+def just_over_400_hours(path):
+    # 2023-01-01 00:00 to 2023-01-17 16:30: the truncated hours span exactly 400, the timestamps a bit more
+    dates = pd.date_range('2023-01-01 00:00', '2023-01-17 16:30', freq='30min').strftime('%Y-%m-%d %H:%M').tolist()
+    write_export(path, dates)
+
+def numeric_locations(path):
+    # Postcode-like locations are read as numbers by pandas; a late missing one makes them floats
+    dates = pd.date_range('2023-01-01', periods=LATE_ROW + 1, freq='min').strftime('%Y-%m-%d %H:%M').tolist()
+    write_export(path, dates, locations=[str(10000 + i % 9) for i in range(LATE_ROW)] + [''])
+
+def utc_offset_days(path):
+    # A half-hour offset, so local days (and hours) start at different instants than UTC ones
+    dates = pd.date_range('2023-01-01', periods=3_000, freq='17min').strftime('%Y-%m-%d %H:%M+05:30').tolist()
+    write_export(path, dates)
+
+def utc_offset_hours(path):
+    dates = pd.date_range('2023-01-01 20:00', periods=500, freq='7min').strftime('%Y-%m-%dT%H:%M:%SZ').tolist()
+    write_export(path, dates)
+
+def synthetic_year(path):
+    generate_media_csv(path, rows=20_000, days=365, locations=80, seed=1)
+
+def synthetic_short_span(path):
+    generate_media_csv(path, rows=20_000, days=3, seed=2)
+
+EXPORTS = [synthetic_year, synthetic_short_span, late_bad_date, late_text_engagement, ambiguous_day_month,
+           just_over_400_hours, numeric_locations, utc_offset_days, utc_offset_hours]
+
+@pytest.mark.parametrize('write', EXPORTS, ids=[write.__name__ for write in EXPORTS])
+def test_duckdb_matches_pandas(tmp_path, write):
+    path = str(tmp_path / 'export.csv')
+    write(path)
+    assert check_backend_equivalence(path, ['duckdb']) == {'duckdb': []}